@@ -0,0 +1,360 @@
+import asyncio
+from neo4j_driver.async_neo4j_repo import AsyncNeo4jRepository
+from neo4j_driver.instrumentation import instrumented, plan_operators
+from ontology_repo import OntologyRepositoryBase
+
+
+class AsyncOntologyRepository(OntologyRepositoryBase):
+
+    neo_repo: AsyncNeo4jRepository
+
+    def __init__(self, neo_repo: AsyncNeo4jRepository, cache_size: int = None,
+                 signature_cache_size: int = 1024, inline_values: bool = False):
+        super().__init__(neo_repo, cache_size, signature_cache_size, inline_values)
+        self._closure_lock = asyncio.Lock()
+
+    @instrumented
+    async def ensure_schema(self):
+        await self.neo_repo.ensure_schema(self.SCHEMA_LABELS)
+
+    async def _cached(self, key, load, depends_on):
+        missing = object()
+        value = self._cache_get(key, missing)
+        if value is missing:
+            value = await load()
+            self._cache_put(key, value, depends_on(value))
+        return value
+
+    async def _query_nodes(self, query, params, key):
+        return self._nodes(await self.neo_repo.run_custom_query(query, params, write=False), key)
+
+    @instrumented
+    async def create_class(self, title: str, description: str, parent_uri: str = None):
+        node = await self.neo_repo.create_node(
+            ["Class"], {"title": title, "description": description}
+        )
+        if parent_uri:
+            await self.neo_repo.create_arc(node["uri"], parent_uri, "SUBCLASS_OF")
+        self._class_created(node, parent_uri)
+        return node
+
+    @instrumented
+    async def get_class(self, uri: str, **read_options):
+        return await self.neo_repo.get_node_by_uri(uri, **read_options)
+
+    @instrumented
+    async def update_class(self, uri: str, title: str = None, description: str = None):
+        node = await self.neo_repo.update_node(uri, self._class_updates(title, description))
+        self._invalidate(uri)
+        return node
+
+    @instrumented
+    async def delete_class(self, uri: str):
+        records = await self.neo_repo.run_custom_query(
+            self.SUBTREE_CLASSES_QUERY, {"uri": uri}, write=False
+        )
+        class_uris = records[0]["class_uris"] if records else []
+        deleted = {kind: 0 for kind, _ in self.DELETE_SUBTREE_STEPS}
+        if class_uris:
+            for kind, query in self._delete_subtree_queries():
+                records = await self.neo_repo.run_auto_commit_query(
+                    query, {"uris": class_uris, "track": self.neo_repo.track_changes}
+                )
+                deleted[kind] = records[0]["deleted"] if records else 0
+        self._classes_deleted(uri, class_uris)
+        return deleted
+
+    @instrumented
+    async def get_ontology(self):
+        return await self.neo_repo.get_all_nodes_and_arcs()
+
+    def iter_ontology(self, page_size: int = None):
+        return self.neo_repo.iter_nodes_and_arcs(page_size)
+
+    def changes_since(self, version: int = 0, page_size: int = None):
+        return self.neo_repo.changes_since(version, page_size)
+
+    @instrumented
+    async def get_ontology_parent_classes(self):
+        return await self._cached(
+            self.ROOTS_KEY,
+            lambda: self._query_nodes(self.ROOT_CLASSES_QUERY, None, "c"),
+            self._node_uris,
+        )
+
+    @instrumented
+    async def get_class_parents(self, class_uri: str):
+        return await self._cached(
+            ("parents", class_uri),
+            lambda: self._query_nodes(self.CLASS_PARENTS_QUERY, {"uri": class_uri}, "p"),
+            lambda nodes: [class_uri] + self._node_uris(nodes),
+        )
+
+    @instrumented
+    async def get_class_children(self, class_uri: str):
+        return await self._cached(
+            ("children", class_uri),
+            lambda: self._query_nodes(self.CLASS_CHILDREN_QUERY, {"uri": class_uri}, "c"),
+            lambda nodes: [class_uri] + self._node_uris(nodes),
+        )
+
+    async def _class_closure(self):
+        async with self._closure_lock:
+            if not self.closure.loaded:
+                records = await self.neo_repo.run_custom_query(self.CLASS_CLOSURE_QUERY, write=False)
+                self.closure.load({rec["uri"]: rec["parents"] for rec in records})
+        return self.closure
+
+    @instrumented
+    async def export_class_graph(self):
+        return self._class_graph(
+            await self.neo_repo.run_custom_query(self.CLASS_CLOSURE_QUERY, write=False)
+        )
+
+    @instrumented
+    async def refresh_class_closure(self):
+        self.closure.reset()
+        return await self._class_closure()
+
+    async def _get_classes(self, uris):
+        if not uris:
+            return []
+        return await self._query_nodes(self.CLASSES_BY_URIS_QUERY, {"uris": list(uris)}, "c")
+
+    @instrumented
+    async def get_class_ancestors(self, class_uri: str):
+        closure = await self._class_closure()
+        return await self._get_classes(closure.ancestors(class_uri))
+
+    @instrumented
+    async def get_class_descendants(self, class_uri: str):
+        closure = await self._class_closure()
+        return await self._get_classes(closure.descendants(class_uri))
+
+    @instrumented
+    async def is_subclass_of(self, class_uri: str, parent_uri: str):
+        closure = await self._class_closure()
+        return closure.is_subclass_of(class_uri, parent_uri)
+
+    @instrumented
+    async def add_class_attribute(self, class_uri: str, title: str):
+        prop_node = await self.neo_repo.create_node(["DatatypeProperty"], {"title": title})
+        await self.neo_repo.create_arc(class_uri, prop_node["uri"], "DOMAIN")
+        self._signature_changed(class_uri)
+        return prop_node
+
+    @instrumented
+    async def delete_class_attribute(self, class_uri: str, title: str):
+        await self.neo_repo.run_custom_query(
+            self.DELETE_CLASS_ATTRIBUTE_QUERY, {"uri": class_uri, "title": title}
+        )
+        self._signature_changed(class_uri)
+
+    @instrumented
+    async def add_class_object_attribute(self, class_uri: str, title: str, range_class_uri: str):
+        prop_node = await self.neo_repo.create_node(["ObjectProperty"], {"title": title})
+        await self.neo_repo.create_arc(class_uri, prop_node["uri"], "DOMAIN")
+        await self.neo_repo.create_arc(prop_node["uri"], range_class_uri, "RANGE")
+        self._signature_changed(class_uri)
+        return prop_node
+
+    @instrumented
+    async def delete_class_object_attribute(self, object_property_uri: str):
+        records = await self.neo_repo.run_custom_query(
+            self.DELETE_CLASS_OBJECT_ATTRIBUTE_QUERY, {"uri": object_property_uri}
+        )
+        if records:
+            self._signature_changed(*records[0]["class_uris"])
+
+    @instrumented
+    async def collect_signature(self, class_uri: str):
+        async def load():
+            records = await self.neo_repo.run_custom_query(
+                self.SIGNATURE_QUERY, {"uri": class_uri}, write=False
+            )
+            return self._signature_from_record(records[0])
+
+        return await self._cached(
+            ("signature", class_uri),
+            load,
+            lambda sig: self._signature_depends_on(class_uri, sig),
+        )
+
+    @instrumented
+    async def collect_effective_signatures(self, class_uris: list):
+        missing = object()
+        signatures = {uri: self.effective_signatures.get(uri, missing)
+                      for uri in dict.fromkeys(class_uris)}
+        if missing not in signatures.values():
+            return signatures
+
+        await self._class_closure()
+        lineages = self._pending_lineages(signatures, missing)
+        records = await self.neo_repo.run_custom_query(
+            self.DIRECT_SIGNATURES_QUERY,
+            {"uris": list({a for lineage in lineages.values() for a in lineage})},
+            write=False,
+        )
+        direct = {rec["uri"]: self._signature_from_record(rec) for rec in records}
+        return self._merge_effective_signatures(lineages, direct, signatures)
+
+    @instrumented
+    async def create_object(self, class_uri: str, properties: dict, relations: dict = None):
+        return (await self.create_objects(class_uri, [(properties, relations)]))[0]
+
+    @instrumented
+    async def create_objects(self, class_uri: str, objects: list, chunk_size: int = None):
+        chunk_size = chunk_size or self.neo_repo.chunk_size
+        rows = self._object_rows(objects)
+        if self.inline_values:
+            signatures = await self.collect_effective_signatures([class_uri])
+            self._validate_rows(class_uri, signatures[class_uri], rows)
+        created = [None] * len(rows)
+        for chunk in self.neo_repo._chunks(rows, chunk_size):
+            query, params = self._create_objects_query(class_uri, chunk)
+            for rec in await self.neo_repo.run_custom_query(query, params):
+                created[rec["idx"]] = self.neo_repo._extract_node(rec["o"])
+        return created
+
+    @instrumented
+    async def get_object(self, object_uri: str, **read_options):
+        return await self.neo_repo.get_node_by_uri(object_uri, **read_options)
+
+    @instrumented
+    async def update_object(self, object_uri: str, updates: dict):
+        return await self.neo_repo.update_node(object_uri, updates)
+
+    @instrumented
+    async def delete_object(self, object_uri: str):
+        return await self.neo_repo.delete_node_by_uri(object_uri)
+
+    @instrumented
+    async def get_objects(self, uris: list):
+        uris = list(uris)
+        if not uris:
+            return []
+        records = await self.neo_repo.run_custom_query(
+            self.OBJECTS_BY_URIS_QUERY, {"uris": uris}, write=False
+        )
+        return self._objects_in_order(uris, records)
+
+    @instrumented
+    async def list_objects(self, class_uri: str, include_subclasses: bool = False, page_size: int = None):
+        page_size = page_size or self.neo_repo.page_size
+        class_uris = [class_uri]
+        if include_subclasses:
+            closure = await self._class_closure()
+            class_uris += sorted(closure.descendants(class_uri))
+        after = ""
+        while True:
+            records = await self.neo_repo.run_custom_query(
+                self.OBJECTS_PAGE_QUERY,
+                {"class_uris": class_uris, "after": after, "limit": page_size},
+                write=False,
+            )
+            for rec in records:
+                yield self._hydrate_object(rec)
+            if len(records) < page_size:
+                return
+            after = records[-1]["uri"]
+
+    async def _ensure_indexes(self, statements):
+        for name, statement in statements:
+            if name not in self._indexes:
+                await self.neo_repo.run_auto_commit_query(statement)
+                await self.neo_repo.run_auto_commit_query("CALL db.awaitIndex($name)", {"name": name})
+                self._indexes.add(name)
+
+    async def _class_uris(self, class_uri: str, include_subclasses: bool):
+        class_uris = [class_uri]
+        if include_subclasses:
+            closure = await self._class_closure()
+            class_uris += sorted(closure.descendants(class_uri))
+        return class_uris
+
+    async def _prepare_find(self, class_uri: str, filters: dict, include_subclasses: bool):
+        predicates = self._filter_predicates(filters)
+        signatures = await self.collect_effective_signatures([class_uri])
+        self._validate_attributes(class_uri, signatures[class_uri], [field for field, _, _ in predicates])
+        await self._ensure_indexes(self._attribute_index_statements(predicates))
+        query, params = self._find_objects_query(predicates)
+        params["class_uris"] = await self._class_uris(class_uri, include_subclasses)
+        return query, params
+
+    @instrumented
+    async def find_objects(self, class_uri: str, filters: dict = None, limit: int = None,
+                           after: str = "", include_subclasses: bool = False):
+        query, params = await self._prepare_find(class_uri, filters, include_subclasses)
+        params.update({"after": after or "", "limit": limit or self.neo_repo.page_size})
+        records = await self.neo_repo.run_custom_query(query, params, write=False)
+        return [self._hydrate_object(rec) for rec in records]
+
+    @instrumented
+    async def explain_find_objects(self, class_uri: str, filters: dict = None,
+                                   include_subclasses: bool = False):
+        query, params = await self._prepare_find(class_uri, filters, include_subclasses)
+        params.update({"after": "", "limit": self.neo_repo.page_size})
+        return plan_operators(await self.neo_repo.explain(query, params))
+
+    @instrumented
+    async def search_objects(self, text: str, class_uri: str = None, limit: int = None, skip: int = 0,
+                             include_subclasses: bool = False):
+        await self._ensure_indexes([self._fulltext_index_statement()])
+        class_uris = await self._class_uris(class_uri, include_subclasses) if class_uri else None
+        records = await self.neo_repo.run_custom_query(self.SEARCH_OBJECTS_QUERY, {
+            "index": self.OBJECT_FULLTEXT_INDEX, "text": text, "class_uris": class_uris,
+            "skip": skip, "limit": limit or self.neo_repo.page_size,
+        }, write=False)
+        return [{**self._hydrate_object(rec), "score": rec["score"]} for rec in records]
+
+    @instrumented
+    async def get_object_attributes(self, object_uri: str):
+        query = self.INLINE_ATTRIBUTES_QUERY if self.inline_values else self.OBJECT_ATTRIBUTES_QUERY
+        records = await self.neo_repo.run_custom_query(query, {"uri": object_uri}, write=False)
+        if not records:
+            return None
+        return self._attributes_from_record(records[0])
+
+    @instrumented
+    async def update_object_attributes(self, object_uri: str, values: dict):
+        records = await self.neo_repo.run_custom_query(
+            self.OBJECT_CLASS_QUERY, {"uri": object_uri}, write=False
+        )
+        if not records:
+            return None
+        fields, attributes = self._split_fields(values)
+        class_uri = records[0]["class_uri"]
+        signatures = await self.collect_effective_signatures([class_uri])
+        self._validate_attributes(class_uri, signatures[class_uri], attributes)
+        if self.inline_values:
+            records = await self.neo_repo.run_custom_query(
+                self.SET_INLINE_ATTRIBUTES_QUERY, {"uri": object_uri, "values": {**fields, **attributes}}
+            )
+            return self._attributes_from_record(records[0]) if records else None
+        await self.neo_repo.run_custom_query(self.REPLACE_VALUE_NODES_QUERY, {
+            "uri": object_uri, "fields": fields, "titles": list(attributes),
+            "values": self._value_rows(attributes),
+        })
+        return await self.get_object_attributes(object_uri)
+
+    @instrumented
+    async def migrate_values_inline(self, batch_size: int = None):
+        batch_size = batch_size or self.neo_repo.chunk_size
+        migrated = {"objects": 0, "values": 0}
+        after = ""
+        while True:
+            objects, values, after = await self.neo_repo._write(self._migrate_values_batch, batch_size, after)
+            if not objects:
+                return migrated
+            migrated["objects"] += objects
+            migrated["values"] += values
+
+    async def _migrate_values_batch(self, tx, limit: int, after: str):
+        records = await self.neo_repo._records(
+            tx, self.VALUES_TO_MIGRATE_QUERY, {"after": after, "limit": limit}
+        )
+        if not records:
+            return 0, 0, after
+        rows = self._inline_rows(records)
+        result = await self.neo_repo._records(tx, self.INLINE_VALUES_QUERY, {"rows": rows})
+        return len(rows), result[0]["values"], rows[-1]["uri"]
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+
+class ClassHierarchyCache:
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        # key -> (value, uris the value was built from)
+        self._entries = OrderedDict()
+        # uri -> keys whose values mention that uri
+        self._dependents = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def get_or_load(self, key, load, depends_on):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = load()
+            self.put(key, value, depends_on(value))
+        return value
+
+    def put(self, key, value, depends_on=()):
+        with self._lock:
+            self._drop(key)
+            deps = frozenset(depends_on)
+            self._entries[key] = (value, deps)
+            for uri in deps:
+                self._dependents.setdefault(uri, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *uris):
+        with self._lock:
+            for uri in uris:
+                for key in list(self._dependents.get(uri, ())):
+                    self._drop(key)
+
+    def invalidate_key(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dependents.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for uri in entry[1]:
+            keys = self._dependents.get(uri)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._dependents[uri]
@@ -0,0 +1,69 @@
+import threading
+
+
+class ClassClosureIndex:
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = threading.RLock()
+        # uri -> strict ancestors / strict descendants along SUBCLASS_OF
+        self._ancestors = {}
+        self._descendants = {}
+
+    def load(self, parents_by_class: dict):
+        with self._lock:
+            self._ancestors = {uri: set() for uri in parents_by_class}
+            self._descendants = {uri: set() for uri in parents_by_class}
+            for uri, parents in parents_by_class.items():
+                for parent_uri in parents:
+                    self.add_edge(uri, parent_uri)
+            self.loaded = True
+
+    def reset(self):
+        with self._lock:
+            self._ancestors = {}
+            self._descendants = {}
+            self.loaded = False
+
+    def add_class(self, uri: str, parent_uri: str = None):
+        with self._lock:
+            self._ancestors.setdefault(uri, set())
+            self._descendants.setdefault(uri, set())
+            if parent_uri:
+                self.add_edge(uri, parent_uri)
+
+    def add_edge(self, child_uri: str, parent_uri: str):
+        with self._lock:
+            for uri in (child_uri, parent_uri):
+                self._ancestors.setdefault(uri, set())
+                self._descendants.setdefault(uri, set())
+            upper = {parent_uri} | self._ancestors[parent_uri]
+            lower = {child_uri} | self._descendants[child_uri]
+            for uri in lower:
+                self._ancestors[uri] |= upper
+            for uri in upper:
+                self._descendants[uri] |= lower
+
+    def remove_classes(self, uris):
+        # Only whole subtrees are removed, so no surviving class can lose an
+        # ancestor through a removed one.
+        with self._lock:
+            for uri in uris:
+                for ancestor in self._ancestors.pop(uri, ()):
+                    self._descendants.get(ancestor, set()).discard(uri)
+                for descendant in self._descendants.pop(uri, ()):
+                    self._ancestors.get(descendant, set()).discard(uri)
+
+    def ancestors(self, uri: str):
+        with self._lock:
+            return frozenset(self._ancestors.get(uri, ()))
+
+    def descendants(self, uri: str):
+        with self._lock:
+            return frozenset(self._descendants.get(uri, ()))
+
+    def is_subclass_of(self, uri: str, parent_uri: str):
+        with self._lock:
+            if uri not in self._ancestors:
+                return False
+            return uri == parent_uri or parent_uri in self._ancestors[uri]
@@ -0,0 +1,305 @@
+import asyncio
+import time
+from neo4j import AsyncGraphDatabase
+from neo4j.exceptions import DriverError, Neo4jError
+
+try:
+    from neo4j_driver.neo4j_repo import Neo4jRepositoryBase
+    from neo4j_driver.instrumentation import instrumented
+    from neo4j_driver.graph_csr import CSRBuilder
+except ImportError:
+    from neo4j_repo import Neo4jRepositoryBase
+    from instrumentation import instrumented
+    from graph_csr import CSRBuilder
+
+
+class AsyncNeo4jRepository(Neo4jRepositoryBase):
+
+    DEFAULT_MAX_CONCURRENCY = 32
+
+    def __init__(self, uri, user, password, chunk_size=Neo4jRepositoryBase.DEFAULT_CHUNK_SIZE,
+                 page_size=Neo4jRepositoryBase.DEFAULT_PAGE_SIZE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, **options):
+        super().__init__(chunk_size, page_size, **options)
+        if self.causal_consistency:
+            self._bookmark_manager = AsyncGraphDatabase.bookmark_manager()
+        self._driver = AsyncGraphDatabase.driver(uri, auth=(user, password), **self.driver_config)
+        # bounds how many sessions callers can hold at once through asyncio.gather
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def verify_connectivity(self):
+        await self._driver.verify_connectivity()
+
+    async def health_check(self):
+        start = time.perf_counter()
+        status = {"ok": True, "error": None}
+        try:
+            async with self._session() as session:
+                result = await session.run("RETURN 1 AS ok")
+                await result.consume()
+        except (Neo4jError, DriverError) as error:
+            status.update(ok=False, error=f"{type(error).__name__}: {error}")
+        status["latency_ms"] = (time.perf_counter() - start) * 1000
+        return status
+
+    async def close(self):
+        if self._driver:
+            await self._driver.close()
+
+    def _session(self):
+        return self._driver.session(**self._session_config())
+
+    async def _ensure_base_label(self):
+        if not self._base_label_migrated:
+            async with self._session() as session:
+                result = await session.run(self._base_label_statement())
+                await result.consume()
+            self._base_label_migrated = True
+
+    async def _read(self, work, *args):
+        await self._ensure_base_label()
+        async with self._semaphore:
+            async with self._session() as session:
+                return await session.execute_read(work, *args)
+
+    async def _write(self, work, *args):
+        await self._ensure_base_label()
+        async with self._semaphore:
+            async with self._session() as session:
+                return await session.execute_write(work, *args)
+
+    async def _next_version(self, tx):
+        if not self.track_changes:
+            return None
+        result = await tx.run(self.NEXT_VERSION_QUERY)
+        return (await result.single())["version"]
+
+    async def _records(self, tx, query, params, profile=True):
+        if self._with_version(query, params):
+            params = {**params, "version": await self._next_version(tx)}
+        if self.metrics is None:
+            result = await tx.run(query, **params)
+            return [record async for record in result]
+        start = time.perf_counter()
+        result = await tx.run(self._profiled(query) if profile else query, **params)
+        records = [record async for record in result]
+        self._record_query(query, start, records, await result.consume())
+        return records
+
+    async def _read_query(self, query, params=None):
+        return await self._read(self._records, query, params or {})
+
+    async def _write_query(self, query, params=None):
+        return await self._write(self._records, query, params or {})
+
+    async def _write_chunks(self, groups, chunk_size, make_query, extract):
+        created = {}
+        for key, rows in groups.items():
+            query = make_query(key)
+            for chunk in self._chunks(rows, chunk_size):
+                for rec in await self._write_query(query, {"rows": chunk}):
+                    created[rec["idx"]] = extract(rec)
+        return created
+
+    @instrumented
+    async def create_node(self, labels, properties):
+        properties["uri"] = self.generate_random_string()
+        records = await self._write_query(self._create_node_query(labels), {"props": properties})
+        if records:
+            return self._extract_node(records[0]["a"])
+        return None
+
+    @instrumented
+    async def create_nodes(self, batch, chunk_size=None):
+        batch = list(batch)
+        created = await self._write_chunks(
+            self._group_nodes(batch), chunk_size or self.chunk_size,
+            self._create_nodes_query, lambda rec: self._extract_node(rec["a"]),
+        )
+        return [created.get(idx) for idx in range(len(batch))]
+
+    @instrumented
+    async def get_nodes_by_labels(self, labels):
+        if not labels:
+            return []
+        records = await self._read_query(self._nodes_by_labels_query(labels))
+        return [self._extract_node(record["a"]) for record in records]
+
+    @instrumented
+    async def iter_node_pages(self, page_size=None):
+        page_size = page_size or self.page_size
+        after = ""
+        while True:
+            records = await self._read_query(
+                self.FETCH_NODES_PAGE_QUERY, {"after": after, "limit": page_size}
+            )
+            page = self._nodes_with_arcs(records)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = page[-1]["uri"]
+
+    @instrumented
+    async def iter_nodes_and_arcs(self, page_size=None):
+        async for page in self.iter_node_pages(page_size):
+            for node in page:
+                yield node
+
+    @instrumented
+    async def get_all_nodes(self):
+        records = await self._read_query(self.GET_ALL_NODES_QUERY)
+        return [self._extract_node(rec["a"]) for rec in records]
+
+    @instrumented
+    async def get_all_nodes_and_arcs(self):
+        return [node async for node in self.iter_nodes_and_arcs()]
+
+    @instrumented
+    async def get_node_by_uri(self, uri, fields=None, arc_types=None, direction="out", arc_limit=None):
+        if self._default_read(fields, arc_types, direction, arc_limit):
+            records = await self._read_query(self.FETCH_NODES_BY_URIS_QUERY, {"uris": [uri]})
+            nodes = self._nodes_with_arcs(records)
+            if nodes:
+                return nodes[0]
+            return None
+        query = self._node_query(fields, arc_types, direction, arc_limit, with_arcs=True)
+        records = await self._read_query(query, {"uri": uri, "arc_limit": arc_limit})
+        if not records:
+            return None
+        return self._projected_node(records[0])
+
+    async def iter_arcs(self, uri, arc_types=None, direction="out", page_size=None):
+        # async counterpart of the sync repository's lazy arcs
+        page_size = page_size or self.page_size
+        query = self._arcs_page_query(arc_types, direction)
+        skip = 0
+        while True:
+            records = await self._read_query(query, {"uri": uri, "skip": skip, "limit": page_size})
+            for rec in records:
+                yield self._arc_from_map(rec["arc"])
+            if len(records) < page_size:
+                return
+            skip += len(records)
+
+    @instrumented
+    async def create_arc(self, node1_uri, node2_uri, rel_type):
+        records = await self._write_query(
+            self._create_arc_query(rel_type), {"uri1": node1_uri, "uri2": node2_uri}
+        )
+        if records:
+            return self._extract_arc(records[0]["r"])
+        return None
+
+    @instrumented
+    async def create_arcs(self, batch, chunk_size=None):
+        batch = list(batch)
+        created = await self._write_chunks(
+            self._group_arcs(batch), chunk_size or self.chunk_size,
+            self._create_arcs_query, lambda rec: self._extract_arc(rec["r"]),
+        )
+        return [created.get(idx) for idx in range(len(batch))]
+
+    async def _merge_chunks(self, groups, chunk_size, make_query):
+        merged = 0
+        for key, rows in groups.items():
+            query = make_query(key)
+            for chunk in self._chunks(rows, chunk_size):
+                records = await self._write_query(query, {"rows": chunk})
+                merged += records[0]["merged"] if records else 0
+        return merged
+
+    @instrumented
+    async def merge_nodes(self, batch, chunk_size=None):
+        return await self._merge_chunks(
+            self._group_merge_nodes(batch), chunk_size or self.chunk_size, self._merge_nodes_query
+        )
+
+    @instrumented
+    async def merge_arcs(self, batch, chunk_size=None):
+        return await self._merge_chunks(
+            self._group_arcs(batch), chunk_size or self.chunk_size, self._merge_arcs_query
+        )
+
+    @instrumented
+    async def delete_node_by_uri(self, uri):
+        records = await self._write_query(self.DELETE_NODE_QUERY, {"uri": uri})
+        if records:
+            return records[0]["deleted_count"] > 0
+        return False
+
+    @instrumented
+    async def delete_arc_by_id(self, arc_id):
+        records = await self._write_query(self.DELETE_ARC_QUERY, {"id": str(arc_id)})
+        if records:
+            return records[0]["deleted_count"] > 0
+        return False
+
+    @instrumented
+    async def update_node(self, uri, params_to_update):
+        if not params_to_update:
+            return await self.get_node_by_uri(uri)
+        records = await self._write_query(
+            self.UPDATE_NODE_QUERY, {"uri": uri, "updates": params_to_update}
+        )
+        if records:
+            return self._extract_node(records[0]["n"])
+        return None
+
+    @instrumented
+    async def ensure_schema(self, labels=()):
+        # schema commands and CALL ... IN TRANSACTIONS need auto-commit transactions
+        await self._ensure_base_label()
+        async with self._session() as session:
+            for statement in self._schema_statements(labels):
+                await self._records(session, statement, {}, profile=False)
+
+    @instrumented
+    async def export_csr(self, page_size=None):
+        builder = CSRBuilder()
+        async for node in self.iter_nodes_and_arcs(page_size):
+            builder.add_node_with_arcs(node)
+        return builder.build()
+
+    @instrumented
+    async def current_version(self):
+        return (await self._read_query(self.CURRENT_VERSION_QUERY))[0]["version"]
+
+    @instrumented
+    async def changes_since(self, version=0, page_size=None):
+        page_size = page_size or self.page_size
+        after = None
+        while True:
+            page = self._changes(await self._read_query(
+                self.CHANGES_PAGE_QUERY, {"version": version, "after": after, "limit": page_size}
+            ))
+            for change in page:
+                yield change
+            if len(page) < page_size:
+                return
+            version, after = page[-1]["version"], page[-1]["uri"]
+
+    @instrumented
+    async def purge_tombstones(self, before_version):
+        records = await self.run_auto_commit_query(self.PURGE_TOMBSTONES_QUERY, {"before": before_version})
+        return records[0]["purged"]
+
+    @instrumented
+    async def explain(self, query, params=None):
+        await self._ensure_base_label()
+        async with self._session() as session:
+            result = await session.run("EXPLAIN " + query, params or {})
+            return (await result.consume()).plan
+
+    @instrumented
+    async def run_auto_commit_query(self, query, params=None):
+        await self._ensure_base_label()
+        async with self._session() as session:
+            return await self._records(session, query, params or {}, profile=False)
+
+    @instrumented
+    async def run_custom_query(self, query, params=None, write=True):
+        if write:
+            return await self._write_query(query, params)
+        return await self._read_query(query, params)
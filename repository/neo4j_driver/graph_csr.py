@@ -0,0 +1,199 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("CSR export needs the numpy package")
+
+
+def _csr(src, dst, n):
+    order = np.argsort(src, kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+    return offsets, dst[order]
+
+
+def _gather(offsets, targets, frontier):
+    # neighbours of every frontier node in one vectorized step
+    starts = offsets[frontier]
+    counts = offsets[frontier + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return targets[:0]
+    base = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return targets[base + np.arange(total)]
+
+
+class CSRBuilder:
+
+    MAX_LABELS = 64
+
+    def __init__(self):
+        self.index = {}
+        self.uris = []
+        self.labels = {}
+        self._masks = []
+        self._arcs = {}
+
+    def _node(self, uri):
+        idx = self.index.get(uri)
+        if idx is None:
+            idx = self.index[uri] = len(self.uris)
+            self.uris.append(uri)
+            self._masks.append(0)
+        return idx
+
+    def _label_bit(self, label):
+        bit = self.labels.get(label)
+        if bit is None:
+            if len(self.labels) >= self.MAX_LABELS:
+                raise ValueError(f"Label bitmasks hold at most {self.MAX_LABELS} labels")
+            bit = self.labels[label] = len(self.labels)
+        return bit
+
+    def add_node(self, uri, labels=()):
+        idx = self._node(uri)
+        for label in labels:
+            self._masks[idx] |= 1 << self._label_bit(label)
+        return idx
+
+    def add_arc(self, rel_type, src_uri, dst_uri):
+        src, dst = self._arcs.setdefault(rel_type, (array("q"), array("q")))
+        src.append(self._node(src_uri))
+        dst.append(self._node(dst_uri))
+
+    def add_node_with_arcs(self, node):
+        self.add_node(node["uri"], node["labels"])
+        for arc in node["arcs"]:
+            self.add_arc(arc["uri"], arc["node_uri_from"], arc["node_uri_to"])
+
+    def build(self):
+        _require_numpy()
+        n = len(self.uris)
+        adjacency = {
+            rel_type: (np.frombuffer(src, dtype=np.int64), np.frombuffer(dst, dtype=np.int64))
+            for rel_type, (src, dst) in self._arcs.items()
+        }
+        return CSRGraph(
+            np.array(self.uris, dtype=object), self.index, list(self.labels),
+            np.array(self._masks, dtype=np.uint64), adjacency,
+        )
+
+
+class CSRGraph:
+
+    def __init__(self, uris, index, labels, label_masks, edges):
+        self.uris = uris
+        self.index = index
+        self.labels = labels
+        self.label_masks = label_masks
+        self._edges = edges
+        n = len(uris)
+        # rel_type -> (offsets, targets), offsets has one extra trailing entry
+        self.adjacency = {rel_type: _csr(src, dst, n) for rel_type, (src, dst) in edges.items()}
+        self._reverse = {}
+
+    def __len__(self):
+        return len(self.uris)
+
+    def _csr_for(self, rel_type, reverse=False):
+        if not reverse:
+            return self.adjacency[rel_type]
+        if rel_type not in self._reverse:
+            src, dst = self._edges[rel_type]
+            self._reverse[rel_type] = _csr(dst, src, len(self.uris))
+        return self._reverse[rel_type]
+
+    def _indices(self, nodes):
+        if isinstance(nodes, str):
+            nodes = [nodes]
+        return np.array([self.index[n] if isinstance(n, str) else n for n in nodes], dtype=np.int64)
+
+    def label_mask(self, *labels):
+        mask = 0
+        for label in labels:
+            mask |= 1 << self.labels.index(label)
+        return np.uint64(mask)
+
+    def nodes_with_label(self, label):
+        if label not in self.labels:
+            return np.array([], dtype=np.int64)
+        return np.flatnonzero(self.label_masks & self.label_mask(label))
+
+    def degrees(self, rel_type, reverse=False):
+        return np.diff(self._csr_for(rel_type, reverse)[0])
+
+    def neighbors(self, node, rel_type, reverse=False):
+        offsets, targets = self._csr_for(rel_type, reverse)
+        return _gather(offsets, targets, self._indices(node))
+
+    def bfs(self, sources, rel_types=None, reverse=False, max_depth=None):
+        # depth of every node reachable from sources, -1 where unreachable
+        rel_types = list(self.adjacency) if rel_types is None else list(rel_types)
+        csrs = [self._csr_for(rel_type, reverse) for rel_type in rel_types if rel_type in self.adjacency]
+        depth = np.full(len(self.uris), -1, dtype=np.int64)
+        frontier = np.unique(self._indices(sources))
+        depth[frontier] = 0
+        level = 0
+        while frontier.size and (max_depth is None or level < max_depth):
+            level += 1
+            reached = np.concatenate([_gather(offsets, targets, frontier) for offsets, targets in csrs]
+                                     or [frontier[:0]])
+            frontier = np.unique(reached[depth[reached] < 0])
+            depth[frontier] = level
+        return depth
+
+    def reachable(self, sources, rel_types=None, reverse=False, max_depth=None):
+        depth = self.bfs(sources, rel_types, reverse, max_depth)
+        return self.uris[depth > 0].tolist()
+
+    def roots(self, rel_type="SUBCLASS_OF"):
+        # nodes taking part in the hierarchy without a parent of their own
+        has_edges = (self.degrees(rel_type) + self.degrees(rel_type, reverse=True)) > 0
+        return np.flatnonzero(has_edges & (self.degrees(rel_type) == 0))
+
+    def depths(self, rel_type="SUBCLASS_OF"):
+        # rel_type arcs point from child to parent; depth counts steps from the nearest root
+        return self.bfs(self.roots(rel_type), [rel_type], reverse=True)
+
+    def levels(self, rel_type="SUBCLASS_OF"):
+        # longest distance from a root (Kahn's algorithm), -1 for nodes on a cycle
+        offsets, _ = self._csr_for(rel_type)
+        child_offsets, children = self._csr_for(rel_type, reverse=True)
+        pending = np.diff(offsets).copy()
+        level = np.full(len(self.uris), -1, dtype=np.int64)
+        frontier = np.flatnonzero(pending == 0)
+        current = 0
+        while frontier.size:
+            level[frontier] = current
+            reached = _gather(child_offsets, children, frontier)
+            np.subtract.at(pending, reached, 1)
+            frontier = np.unique(reached[pending[reached] == 0])
+            current += 1
+        return level
+
+    def subtree_sizes(self, rel_type="SUBCLASS_OF"):
+        # node count of each subtree, the node included; with multiple
+        # inheritance a class is counted once under every parent
+        offsets, parents = self._csr_for(rel_type)
+        src = np.repeat(np.arange(len(self.uris)), np.diff(offsets))
+        level = self.levels(rel_type)
+        sizes = np.ones(len(self.uris), dtype=np.int64)
+        for current in range(int(level.max(initial=-1)), 0, -1):
+            edges = level[src] == current
+            np.add.at(sizes, parents[edges], sizes[src[edges]])
+        return sizes
+
+
+def export_graph_csr(repo, page_size=None):
+    _require_numpy()
+    builder = CSRBuilder()
+    for page in repo.iter_node_pages(page_size):
+        for node in page:
+            builder.add_node_with_arcs(node)
+    return builder.build()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from itertools import islice
+
+
+def _dump(entry):
+    return json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+
+
+def export_graph(repo, path, page_size=None):
+    # Nodes are written as they are paged in; arcs are spooled to a temporary
+    # file and appended afterwards, so the importer always sees both ends first.
+    nodes = arcs = 0
+    with open(path, "w", encoding="utf-8") as out, \
+            tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        for page in repo.iter_node_pages(page_size):
+            for node in page:
+                out.write(_dump({
+                    "kind": "node",
+                    "labels": node["labels"],
+                    "properties": node["properties"],
+                }))
+                nodes += 1
+                for arc in node["arcs"]:
+                    spool.write(_dump({
+                        "kind": "arc",
+                        "type": arc["uri"],
+                        "from": arc["node_uri_from"],
+                        "to": arc["node_uri_to"],
+                    }))
+                    arcs += 1
+        spool.seek(0)
+        shutil.copyfileobj(spool, out)
+    return {"nodes": nodes, "arcs": arcs}
+
+
+def _checkpoint_path(path):
+    return path + ".checkpoint"
+
+
+def _fingerprint(path, head_size=1 << 16):
+    # a checkpoint only applies to the exact file it was written for
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        head = hashlib.sha256(f.read(head_size)).hexdigest()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "head": head}
+
+
+def _load_checkpoint(path, fingerprint):
+    try:
+        with open(_checkpoint_path(path), encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if state.get("source") != fingerprint:
+        return None
+    return state
+
+
+def _save_checkpoint(path, state):
+    tmp = _checkpoint_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, _checkpoint_path(path))
+
+
+def import_graph(repo, path, chunk_size=None, resume=True, labels=()):
+    # Every write is a MERGE on uri, so replaying a chunk that was committed
+    # but not yet checkpointed is harmless. Without the uri constraints each
+    # MERGE scans the label, so they are ensured before the first chunk.
+    repo.ensure_schema(labels)
+    chunk_size = chunk_size or repo.chunk_size
+    fingerprint = _fingerprint(path)
+    state = {"source": fingerprint, "lines": 0, "nodes": 0, "arcs": 0}
+    if resume:
+        state = _load_checkpoint(path, fingerprint) or state
+
+    with open(path, encoding="utf-8") as f:
+        lines = islice(f, state["lines"], None)
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                break
+            nodes, arcs = [], []
+            for line in chunk:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["kind"] == "node":
+                    nodes.append((entry["labels"], entry["properties"]))
+                else:
+                    arcs.append((entry["from"], entry["to"], entry["type"]))
+            if nodes:
+                state["nodes"] += repo.merge_nodes(nodes, chunk_size)
+            if arcs:
+                state["arcs"] += repo.merge_arcs(arcs, chunk_size)
+            state["lines"] += len(chunk)
+            _save_checkpoint(path, state)
+
+    if os.path.exists(_checkpoint_path(path)):
+        os.remove(_checkpoint_path(path))
+    return {"nodes": state["nodes"], "arcs": state["arcs"]}
@@ -0,0 +1,225 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# name of the outermost public repository method currently running
+current_operation = ContextVar("current_operation", default=None)
+
+
+def _enter(name):
+    if current_operation.get() is None:
+        return current_operation.set(name)
+    return None
+
+
+def _exit(token):
+    if token is not None:
+        current_operation.reset(token)
+
+
+def instrumented(fn):
+    name = fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(self, *args, **kwargs):
+            if self.metrics is None:
+                return await fn(self, *args, **kwargs)
+            token = _enter(name)
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await fn(self, *args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _exit(token)
+                if token is not None:
+                    self.metrics.record_call(name, (time.perf_counter() - start) * 1000, failed)
+        return async_wrapper
+
+    # Generators are timed over the next() calls only, so the consumer's own
+    # work between items is not counted; the call is recorded once the
+    # generator is exhausted, fails or is closed.
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def async_generator_wrapper(self, *args, **kwargs):
+            items = fn(self, *args, **kwargs)
+            outermost = current_operation.get() is None
+            busy = 0.0
+            failed = False
+            try:
+                while True:
+                    token = _enter(name)
+                    start = time.perf_counter()
+                    try:
+                        item = await items.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        busy += time.perf_counter() - start
+                        _exit(token)
+                    yield item
+            except Exception:
+                failed = True
+                raise
+            finally:
+                await items.aclose()
+                if outermost and self.metrics is not None:
+                    self.metrics.record_call(name, busy * 1000, failed)
+        return async_generator_wrapper
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(self, *args, **kwargs):
+            items = fn(self, *args, **kwargs)
+            outermost = current_operation.get() is None
+            busy = 0.0
+            failed = False
+            try:
+                while True:
+                    token = _enter(name)
+                    start = time.perf_counter()
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        return
+                    finally:
+                        busy += time.perf_counter() - start
+                        _exit(token)
+                    yield item
+            except Exception:
+                failed = True
+                raise
+            finally:
+                items.close()
+                if outermost and self.metrics is not None:
+                    self.metrics.record_call(name, busy * 1000, failed)
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if self.metrics is None:
+            return fn(self, *args, **kwargs)
+        token = _enter(name)
+        start = time.perf_counter()
+        failed = False
+        try:
+            return fn(self, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _exit(token)
+            if token is not None:
+                self.metrics.record_call(name, (time.perf_counter() - start) * 1000, failed)
+    return wrapper
+
+
+def db_hits(profile):
+    if not profile:
+        return 0
+    return profile.get("dbHits", 0) + sum(db_hits(child) for child in profile.get("children", []))
+
+
+def plan_operators(plan):
+    if not plan:
+        return []
+    return [plan.get("operatorType")] + [
+        op for child in plan.get("children", []) for op in plan_operators(child)
+    ]
+
+
+class QueryMetrics:
+
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, slow_query_ms=None, profile=False, slow_log_size=100):
+        self.slow_query_ms = slow_query_ms
+        # prefix statements with PROFILE to collect db hits and the executed plan
+        self.profile = profile
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._queries = {}
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _histogram(self):
+        return [0] * (len(self.BUCKETS_MS) + 1)
+
+    def _bucket(self, value_ms):
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if value_ms <= bound:
+                return i
+        return len(self.BUCKETS_MS)
+
+    def record_call(self, operation, wall_ms, failed=False):
+        with self._lock:
+            stats = self._calls.setdefault(operation, {
+                "count": 0, "errors": 0, "wall_ms": 0.0, "histogram": self._histogram(),
+            })
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["wall_ms"] += wall_ms
+            stats["histogram"][self._bucket(wall_ms)] += 1
+
+    def record_query(self, query, wall_ms, rows, summary=None):
+        available_after = getattr(summary, "result_available_after", None)
+        consumed_after = getattr(summary, "result_consumed_after", None)
+        profile = getattr(summary, "profile", None)
+        sample = {
+            "operation": current_operation.get() or "run_custom_query",
+            "query": query,
+            "wall_ms": wall_ms,
+            "server_ms": (available_after or 0) + (consumed_after or 0),
+            "available_after_ms": available_after,
+            "consumed_after_ms": consumed_after,
+            "rows": rows,
+            "db_hits": db_hits(profile) if profile else None,
+            "plan": profile,
+        }
+        with self._lock:
+            stats = self._queries.setdefault(sample["operation"], {
+                "count": 0, "wall_ms": 0.0, "server_ms": 0, "rows": 0, "db_hits": 0,
+                "histogram": self._histogram(),
+            })
+            stats["count"] += 1
+            stats["wall_ms"] += wall_ms
+            stats["server_ms"] += sample["server_ms"]
+            stats["rows"] += rows
+            stats["db_hits"] += sample["db_hits"] or 0
+            stats["histogram"][self._bucket(wall_ms)] += 1
+            if self.slow_query_ms is not None and wall_ms >= self.slow_query_ms:
+                self.slow_queries.append(sample)
+                logger.warning("Slow query in %s (%.1f ms): %s",
+                               sample["operation"], wall_ms, " ".join(query.split()))
+        for callback in self._listeners:
+            callback(sample)
+        return sample
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets_ms": list(self.BUCKETS_MS),
+                "calls": {op: {**stats, "histogram": list(stats["histogram"])}
+                          for op, stats in self._calls.items()},
+                "queries": {op: {**stats, "histogram": list(stats["histogram"])}
+                            for op, stats in self._queries.items()},
+                "slow_queries": len(self.slow_queries),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._queries.clear()
+            self.slow_queries.clear()
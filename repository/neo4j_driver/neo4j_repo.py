@@ -1,41 +1,332 @@
+import os
+import sys
+import threading
+import time
 import uuid
 import json
+import weakref
+from collections.abc import Mapping, Sequence
+from contextlib import ExitStack
 from neo4j import GraphDatabase
 from neo4j.graph import Node, Relationship
-from neo4j.exceptions import Neo4jError
+from neo4j.exceptions import DriverError, Neo4jError
 
+try:
+    from neo4j_driver.instrumentation import instrumented
+    from neo4j_driver.graph_csr import export_graph_csr
+except ImportError:
+    from instrumentation import instrumented
+    from graph_csr import export_graph_csr
 
-class TArc(dict):
-    id: int
-    uri: str
-    node_uri_from: str
-    node_uri_to: str
+# Every node created through the repository carries this label, so that uri
+# lookups hit the uniqueness constraint index instead of scanning all nodes.
+# Nodes written without it (older data, run_custom_query CREATEs) are invisible
+# to uri lookups; each repository tags existing ones on its first session,
+# and custom queries that create nodes should set the label themselves.
+BASE_LABEL = "Resource"
 
+# Change-feed nodes that are not part of the graph itself.
+BOOKKEEPING_LABELS = ("Tombstone", "ChangeSequence")
 
-class TNode(dict):
-    id: int
-    uri: str
-    labels: list
-    properties: dict
-    arcs: list
+# Leaves a change-feed tombstone for the node `n` about to be deleted and
+# stamps the nodes whose arcs into `n` go away with it. With change tracking
+# disabled $version is null and this clause is skipped; every other stamp is
+# written as coalesce($version, x._version) so a null version keeps the
+# node's previous one instead of removing it.
+TOMBSTONE_CLAUSE = """
+    WITH *
+    CALL {
+        WITH n
+        WITH n WHERE $version IS NOT NULL AND n IS NOT NULL
+        MERGE (t:Tombstone {uri: n.uri}) SET t._version = $version
+        WITH n
+        OPTIONAL MATCH (src)-->(n) WHERE src <> n
+        SET src._version = $version
+    }
+"""
 
+# Variant for the body of CALL { ... } IN TRANSACTIONS: a version allocated
+# before the statement would commit long before the chunks do, so each
+# deleted node takes its own version inside its chunk's transaction. Enabled
+# by $track instead of $version.
+CHUNKED_TOMBSTONE_CLAUSE = """
+    CALL {
+        WITH n
+        WITH n WHERE $track
+        MERGE (s:ChangeSequence {name: 'changes'})
+        SET s.value = coalesce(s.value, 0) + 1
+        MERGE (t:Tombstone {uri: n.uri}) SET t._version = s.value
+        WITH n, s.value AS version
+        OPTIONAL MATCH (src)-->(n) WHERE src <> n
+        SET src._version = version
+    }
+"""
 
-class Neo4jRepository:
 
-    def __init__(self, uri, user, password):
-        self._driver = None
+class _SlotRecord(Mapping):
+    # Read-only dict view over __slots__, so records stay compatible with
+    # callers that index them like the plain dicts returned before; to_dict()
+    # gives a plain copy for JSON and other dict-only consumers.
+    __slots__ = ()
+    _keys = ()
+
+    def __getitem__(self, key):
+        if key in self._keys:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key in self._keys if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
         try:
-            driver = GraphDatabase.driver(uri, auth=(user, password))
-            driver.verify_connectivity()
-            self._driver = driver
-            print("Successfully connected to the Neo4j database.")
-        except Neo4jError as error:
-            print(f"Failed to connect: {error}")
+            self[key]
+        except KeyError:
+            return False
+        return True
 
-    def close(self):
-        if self._driver:
-            self._driver.close()
-            print("Database connection closed.")
+    def to_dict(self):
+        return {key: self[key] for key in self}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class TArc(_SlotRecord):
+    __slots__ = ("id", "uri", "node_uri_from", "node_uri_to")
+    _keys = __slots__
+
+    def __init__(self, id, uri, node_uri_from, node_uri_to):
+        self.id = id
+        self.uri = uri
+        self.node_uri_from = node_uri_from
+        self.node_uri_to = node_uri_to
+
+
+class TNode(_SlotRecord):
+    __slots__ = ("id", "uri", "_labels", "_properties", "_items", "arcs")
+    _keys = ("id", "uri", "labels", "properties", "arcs")
+
+    def __init__(self, id, uri, labels, properties=None, arcs=None, items=None):
+        self.id = id
+        self.uri = uri
+        self._labels = tuple(labels)
+        self._properties = properties
+        # (keys, values) tuples, turned into the properties dict on first access
+        self._items = items
+        if arcs is not None:
+            self.arcs = arcs
+
+    @property
+    def labels(self):
+        return [label for label in self._labels if label != BASE_LABEL]
+
+    @property
+    def properties(self):
+        if self._properties is None:
+            keys, values = self._items or ((), ())
+            self._properties = dict(zip(keys, values))
+            self._items = None
+        return self._properties
+
+    def __setitem__(self, key, value):
+        if key != "arcs":
+            raise KeyError(key)
+        self.arcs = value
+
+    def to_dict(self):
+        data = super().to_dict()
+        if "arcs" in data:
+            # also materializes LazyArcs
+            data["arcs"] = [arc.to_dict() if isinstance(arc, _SlotRecord) else dict(arc)
+                            for arc in data["arcs"]]
+        return data
+
+
+class LazyArcs(Sequence):
+    # Arcs of one node, fetched page by page on first access.
+    __slots__ = ("_fetch", "_page_size", "_limit", "_loaded", "_done")
+
+    def __init__(self, fetch, page_size, limit=None):
+        self._fetch = fetch
+        self._page_size = page_size
+        self._limit = limit
+        self._loaded = []
+        self._done = limit is not None and limit <= 0
+
+    def _load_page(self):
+        size = self._page_size
+        if self._limit is not None:
+            size = min(size, self._limit - len(self._loaded))
+        page = self._fetch(len(self._loaded), size)
+        self._loaded.extend(page)
+        if len(page) < size or (self._limit is not None and len(self._loaded) >= self._limit):
+            self._done = True
+
+    def _load_all(self):
+        while not self._done:
+            self._load_page()
+
+    def __iter__(self):
+        i = 0
+        while True:
+            while i < len(self._loaded):
+                yield self._loaded[i]
+                i += 1
+            if self._done:
+                return
+            self._load_page()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or index < 0:
+            self._load_all()
+        else:
+            while index >= len(self._loaded) and not self._done:
+                self._load_page()
+        return self._loaded[index]
+
+    def __len__(self):
+        self._load_all()
+        return len(self._loaded)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        state = "" if self._done else ", ..."
+        return f"LazyArcs({self._loaded!r}{state})"
+
+
+class Neo4jRepositoryBase:
+
+    DEFAULT_CHUNK_SIZE = 1000
+    DEFAULT_PAGE_SIZE = 500
+    DEFAULT_POOL_SIZE = 100
+    DEFAULT_ACQUISITION_TIMEOUT = 60.0
+    DEFAULT_CONNECTION_LIFETIME = 3600
+    DEFAULT_RETRY_TIME = 30.0
+
+    GET_ALL_NODES_QUERY = f"MATCH (a:`{BASE_LABEL}`) RETURN a"
+
+    # targets are returned only so that arc end nodes are hydrated with their uri
+    FETCH_NODES_BY_URIS_QUERY = f"""
+        MATCH (a:`{BASE_LABEL}`) WHERE a.uri IN $uris
+        OPTIONAL MATCH (a)-[r]->(b)
+        RETURN a, collect(r) AS arcs, collect(b) AS targets
+    """
+
+    FETCH_NODES_PAGE_QUERY = f"""
+        MATCH (a:`{BASE_LABEL}`) WHERE a.uri > $after
+        WITH a ORDER BY a.uri LIMIT $limit
+        OPTIONAL MATCH (a)-[r]->(b)
+        RETURN a, collect(r) AS arcs, collect(b) AS targets
+        ORDER BY a.uri
+    """
+
+    DELETE_NODE_QUERY = f"""
+        MATCH (n:`{BASE_LABEL}` {{uri: $uri}})
+        {TOMBSTONE_CLAUSE}
+        DETACH DELETE n
+        RETURN count(n) as deleted_count
+    """
+
+    # the source node is stamped, since its list of arcs changed
+    DELETE_ARC_QUERY = """
+        MATCH (a)-[r]->() WHERE elementId(r) = $id
+        SET a._version = coalesce($version, a._version)
+        DELETE r
+        RETURN count(r) as deleted_count
+    """
+
+    UPDATE_NODE_QUERY = f"""
+        MATCH (n:`{BASE_LABEL}` {{uri: $uri}})
+        SET n += $updates, n._version = coalesce($version, n._version)
+        RETURN n
+    """
+
+    NEXT_VERSION_QUERY = """
+        MERGE (s:ChangeSequence {name: 'changes'})
+        SET s.value = coalesce(s.value, 0) + 1
+        RETURN s.value AS version
+    """
+
+    CURRENT_VERSION_QUERY = """
+        OPTIONAL MATCH (s:ChangeSequence {name: 'changes'})
+        RETURN coalesce(s.value, 0) AS version
+    """
+
+    # keyset on (version, uri); tombstones carry no arcs
+    CHANGES_PAGE_QUERY = f"""
+        CALL {{
+            MATCH (n:`{BASE_LABEL}`) WHERE n._version >= $version
+            RETURN n, false AS deleted
+            UNION ALL
+            MATCH (n:Tombstone) WHERE n._version >= $version
+            RETURN n, true AS deleted
+        }}
+        WITH n, deleted WHERE n._version > $version OR n.uri > $after
+        WITH n, deleted ORDER BY n._version, n.uri LIMIT $limit
+        OPTIONAL MATCH (n)-[r]->(b) WHERE NOT deleted
+        RETURN n AS a, deleted, collect(r) AS arcs, collect(b) AS targets
+        ORDER BY a._version, a.uri
+    """
+
+    PURGE_TOMBSTONES_QUERY = """
+        MATCH (t:Tombstone) WHERE t._version < $before
+        CALL { WITH t DELETE t } IN TRANSACTIONS
+        RETURN count(*) AS purged
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, page_size=DEFAULT_PAGE_SIZE,
+                 database=None, causal_consistency=False,
+                 max_connection_pool_size=DEFAULT_POOL_SIZE,
+                 connection_acquisition_timeout=DEFAULT_ACQUISITION_TIMEOUT,
+                 max_connection_lifetime=DEFAULT_CONNECTION_LIFETIME,
+                 max_transaction_retry_time=DEFAULT_RETRY_TIME, metrics=None,
+                 track_changes=False, migrate_base_label=True):
+        self._driver = None
+        self._base_label_migrated = not migrate_base_label
+        self.metrics = metrics
+        # stamp writes with a version from a shared sequence node for changes_since()
+        self.track_changes = track_changes
+        self.chunk_size = chunk_size
+        self.page_size = page_size
+        self.database = database
+        self.causal_consistency = causal_consistency
+        # shared by all sessions so that reads routed to followers see earlier writes
+        self._bookmark_manager = None
+        self.driver_config = {
+            "max_connection_pool_size": max_connection_pool_size,
+            "connection_acquisition_timeout": connection_acquisition_timeout,
+            "max_connection_lifetime": max_connection_lifetime,
+            "max_transaction_retry_time": max_transaction_retry_time,
+        }
+
+    def _profiled(self, query):
+        if self.metrics is None or not self.metrics.profile:
+            return query
+        if query.lstrip()[:7].upper() in ("PROFILE", "EXPLAIN"):
+            return query
+        return "PROFILE " + query
+
+    def _record_query(self, query, start, records, summary):
+        self.metrics.record_query(query, (time.perf_counter() - start) * 1000, len(records), summary)
+
+    def _session_config(self):
+        config = {}
+        if self.database:
+            config["database"] = self.database
+        if self._bookmark_manager is not None:
+            config["bookmark_manager"] = self._bookmark_manager
+        return config
 
     @staticmethod
     def generate_random_string(length=20):
@@ -43,21 +334,25 @@ class Neo4jRepository:
 
     @staticmethod
     def _extract_node(node_obj: Node):
-        return {
-            "id": node_obj.element_id,
-            "uri": node_obj.get("uri"),
-            "labels": list(node_obj.labels),
-            "properties": dict(node_obj.items()),
-        }
+        # Property keys are interned, so nodes of the same shape share them, and
+        # the dict is only built when read. The Node itself (and the result
+        # graph it belongs to) is not retained.
+        return TNode(node_obj.element_id, node_obj.get("uri"), node_obj.labels,
+                     items=(tuple(map(sys.intern, node_obj.keys())), tuple(node_obj.values())))
 
     @staticmethod
     def _extract_arc(relationship: Relationship):
-        return {
-            "id": relationship.element_id,
-            "uri": relationship.type,
-            "node_uri_from": relationship.start_node.get("uri"),
-            "node_uri_to": relationship.end_node.get("uri"),
-        }
+        return TArc(
+            relationship.element_id,
+            relationship.type,
+            relationship.start_node.get("uri"),
+            relationship.end_node.get("uri"),
+        )
+
+    @staticmethod
+    def _chunks(items, size):
+        for start in range(0, len(items), size):
+            yield items[start:start + size]
 
     def transform_labels(self, labels, separator=':'):
         if len(labels) == 0:
@@ -67,6 +362,9 @@ class Neo4jRepository:
             res += f'`{l}`' + separator
         return res[:-1]
 
+    def _node_labels(self, labels):
+        return ':' + self.transform_labels(list(labels or []) + [BASE_LABEL], separator=':')
+
     def transform_props(self, props):
         if len(props) == 0:
             return ''
@@ -77,49 +375,205 @@ class Neo4jRepository:
         data += '}'
         return data
 
+    def _create_node_query(self, labels):
+        return (f"CREATE (a{self._node_labels(labels)} $props) "
+                f"SET a._version = coalesce($version, a._version) RETURN a")
 
-    def create_node(self, labels, properties):
-        properties["uri"] = self.generate_random_string()
-        labels_formatted = ''
-        if labels:
-            labels_formatted = ':' + self.transform_labels(labels, separator=':')
-
-        query = f"CREATE (a{labels_formatted} $props) RETURN a"
-        with self._driver.session() as session:
-            result = session.run(query, props=properties).single()
-            if result:
-                return self._extract_node(result["a"])
-            return None
+    def _create_nodes_query(self, labels):
+        return f"""
+            UNWIND $rows AS row
+            CREATE (a{self._node_labels(labels)})
+            SET a = row.props, a._version = coalesce($version, a._version)
+            RETURN row.idx AS idx, a
+        """
 
-    def get_nodes_by_labels(self, labels):
-        if not labels:
-            return []
+    def _merge_nodes_query(self, labels):
+        return f"""
+            UNWIND $rows AS row
+            MERGE (a:`{BASE_LABEL}` {{uri: row.uri}})
+            SET a = row.props, a{self._node_labels(labels)},
+                a._version = coalesce($version, row.props._version)
+            RETURN count(a) AS merged
+        """
+
+    def _nodes_by_labels_query(self, labels):
         label_string = ':' + self.transform_labels(labels, separator=':')
-        query = f"MATCH (a{label_string}) RETURN a"
-        with self._driver.session() as session:
-            results = session.run(query)
-            return [self._extract_node(record["a"]) for record in results]
+        return f"MATCH (a{label_string}) RETURN a"
+
+    @staticmethod
+    def _create_arc_query(rel_type):
+        # a and b are returned with r, so the arc endpoints carry their uri
+        return f"""
+            MATCH (a:`{BASE_LABEL}` {{uri: $uri1}}), (b:`{BASE_LABEL}` {{uri: $uri2}})
+            CREATE (a)-[r:`{rel_type}`]->(b)
+            SET a._version = coalesce($version, a._version)
+            RETURN r, a, b
+        """
+
+    @staticmethod
+    def _create_arcs_query(rel_type):
+        return f"""
+            UNWIND $rows AS row
+            MATCH (a:`{BASE_LABEL}` {{uri: row.src}}), (b:`{BASE_LABEL}` {{uri: row.dst}})
+            CREATE (a)-[r:`{rel_type}`]->(b)
+            SET a._version = coalesce($version, a._version)
+            RETURN row.idx AS idx, r, a, b
+        """
 
+    @staticmethod
+    def _merge_arcs_query(rel_type):
+        return f"""
+            UNWIND $rows AS row
+            MATCH (a:`{BASE_LABEL}` {{uri: row.src}}), (b:`{BASE_LABEL}` {{uri: row.dst}})
+            MERGE (a)-[r:`{rel_type}`]->(b)
+            SET a._version = coalesce($version, a._version)
+            RETURN count(r) AS merged
+        """
+
+    def _schema_statements(self, labels):
+        statements = []
+        for label in [BASE_LABEL] + list(labels):
+            name = label.lower()
+            statements.append(
+                f"CREATE CONSTRAINT {name}_uri_unique IF NOT EXISTS "
+                f"FOR (n:`{label}`) REQUIRE n.uri IS UNIQUE"
+            )
+            if label != BASE_LABEL:
+                statements.append(
+                    f"CREATE INDEX {name}_title IF NOT EXISTS FOR (n:`{label}`) ON (n.title)"
+                )
+        statements += [
+            f"CREATE INDEX resource_version IF NOT EXISTS FOR (n:`{BASE_LABEL}`) ON (n._version)",
+            "CREATE INDEX tombstone_version IF NOT EXISTS FOR (n:Tombstone) ON (n._version)",
+            # every delete MERGEs its tombstone on uri
+            "CREATE CONSTRAINT tombstone_uri_unique IF NOT EXISTS "
+            "FOR (n:Tombstone) REQUIRE n.uri IS UNIQUE",
+            "CREATE CONSTRAINT changesequence_name_unique IF NOT EXISTS "
+            "FOR (n:ChangeSequence) REQUIRE n.name IS UNIQUE",
+        ]
+        statements.append(self._base_label_statement())
+        statements.append("CALL db.awaitIndexes()")
+        return statements
+
+    def _base_label_statement(self):
+        # Nodes written before the base label existed are tagged in batches;
+        # change-feed bookkeeping nodes never get it.
+        bookkeeping = "".join(f" AND NOT n:`{label}`" for label in BOOKKEEPING_LABELS)
+        return f"""
+            MATCH (n) WHERE n.uri IS NOT NULL AND NOT n:`{BASE_LABEL}`{bookkeeping}
+            CALL {{ WITH n SET n:`{BASE_LABEL}` }} IN TRANSACTIONS OF {self.chunk_size} ROWS
+        """
+
+    def _group_nodes(self, batch):
+        groups = {}
+        for idx, (labels, properties) in enumerate(batch):
+            properties["uri"] = self.generate_random_string()
+            groups.setdefault(tuple(labels or ()), []).append({"idx": idx, "props": properties})
+        return groups
+
+    @staticmethod
+    def _group_arcs(batch):
+        groups = {}
+        for idx, (node1_uri, node2_uri, rel_type) in enumerate(batch):
+            groups.setdefault(rel_type, []).append({"idx": idx, "src": node1_uri, "dst": node2_uri})
+        return groups
+
+    @staticmethod
+    def _group_merge_nodes(batch):
+        groups = {}
+        for labels, properties in batch:
+            groups.setdefault(tuple(labels or ()), []).append(
+                {"uri": properties["uri"], "props": properties}
+            )
+        return groups
+
+    @staticmethod
+    def _with_version(query, params):
+        return "$version" in query and "version" not in params
+
+    def _changes(self, records):
+        changes = []
+        for rec in records:
+            node = None
+            if not rec["deleted"]:
+                node = self._extract_node(rec["a"])
+                node["arcs"] = [self._extract_arc(rel) for rel in rec["arcs"]]
+            changes.append({
+                "version": rec["a"].get("_version"),
+                "uri": rec["a"].get("uri"),
+                "deleted": rec["deleted"],
+                "node": node,
+            })
+        return changes
 
+    ARC_PATTERNS = {
+        "out": "(a)-[r{types}]->(b)",
+        "in": "(a)<-[r{types}]-(b)",
+        "both": "(a)-[r{types}]-(b)",
+    }
 
-    def _fetch_nodes_with_arcs(self, session, uris=None):
-        if uris:
-            cypher = """
-                MATCH (a) WHERE a.uri IN $uris
-                OPTIONAL MATCH (a)-[r]->()
-                RETURN a, collect(r) AS arcs
+    ARC_MAP = "{id: elementId(r), type: type(r), src: startNode(r).uri, dst: endNode(r).uri}"
+
+    def _arc_pattern(self, arc_types, direction):
+        if direction not in self.ARC_PATTERNS:
+            raise ValueError(f"Unknown arc direction {direction!r}")
+        types = ""
+        if arc_types:
+            types = ":" + "|".join("`" + t.replace("`", "``") + "`" for t in arc_types)
+        return self.ARC_PATTERNS[direction].format(types=types)
+
+    @staticmethod
+    def _node_projection(fields):
+        if fields is None:
+            return "properties(a)"
+        keys = dict.fromkeys(["uri", *fields])
+        return "a {" + ", ".join(".`" + k.replace("`", "``") + "`" for k in keys) + "}"
+
+    def _node_query(self, fields, arc_types, direction, arc_limit, with_arcs):
+        query = f"MATCH (a:`{BASE_LABEL}` {{uri: $uri}})\n"
+        if with_arcs:
+            # no ORDER BY, so the expansion stops after arc_limit relationships
+            limit = "WITH r LIMIT $arc_limit" if arc_limit is not None else ""
+            query += f"""
+            CALL {{
+                WITH a
+                MATCH {self._arc_pattern(arc_types, direction)}
+                {limit}
+                RETURN collect({self.ARC_MAP}) AS arcs
+            }}
             """
-            result = session.run(cypher, uris=uris)
         else:
-            cypher = """
-                MATCH (a)
-                OPTIONAL MATCH (a)-[r]->()
-                RETURN a, collect(r) AS arcs
-            """
-            result = session.run(cypher)
+            query += "WITH a, [] AS arcs\n"
+        query += f"RETURN elementId(a) AS id, labels(a) AS labels, {self._node_projection(fields)} AS props, arcs"
+        return query
+
+    def _arcs_page_query(self, arc_types, direction):
+        # Pages are offsets into the node's unsorted relationship chain: a page
+        # expands only skip + limit relationships instead of sorting all of
+        # them. The chain order is stable while the node's arcs do not change;
+        # arcs created or deleted between pages may shift the following pages.
+        return f"""
+            MATCH (a:`{BASE_LABEL}` {{uri: $uri}})
+            MATCH {self._arc_pattern(arc_types, direction)}
+            WITH r SKIP $skip LIMIT $limit
+            RETURN {self.ARC_MAP} AS arc
+        """
+
+    @staticmethod
+    def _arc_from_map(arc):
+        return TArc(arc["id"], arc["type"], arc["src"], arc["dst"])
+
+    def _projected_node(self, record):
+        return TNode(record["id"], record["props"].get("uri"), record["labels"], record["props"],
+                     [self._arc_from_map(arc) for arc in record["arcs"]])
+
+    @staticmethod
+    def _default_read(fields, arc_types, direction, arc_limit):
+        return fields is None and arc_types is None and direction == "out" and arc_limit is None
 
+    def _nodes_with_arcs(self, records):
         nodes_dict = {}
-        for record in result:
+        for record in records:
             a = record["a"]
             node_uri = a.get("uri")
             if node_uri not in nodes_dict:
@@ -132,83 +586,499 @@ class Neo4jRepository:
 
         return list(nodes_dict.values())
 
+
+class UnitOfWork:
+
+    UPDATE_NODES_QUERY = f"""
+        UNWIND $rows AS row
+        MATCH (n:`{BASE_LABEL}` {{uri: row.uri}})
+        SET n += row.updates, n._version = coalesce($version, n._version)
+        RETURN count(n) AS updated
+    """
+
+    DELETE_NODES_QUERY = f"""
+        UNWIND $uris AS uri
+        MATCH (n:`{BASE_LABEL}` {{uri: uri}})
+        {TOMBSTONE_CLAUSE}
+        DETACH DELETE n
+        RETURN count(n) AS deleted
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self._reset()
+
+    def _reset(self):
+        self._nodes = {}
+        self._arcs = []
+        self._updates = {}
+        self._deletes = {}
+
+    @property
+    def metrics(self):
+        return self.repo.metrics
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._reset()
+
+    def __len__(self):
+        return len(self._nodes) + len(self._arcs) + len(self._updates) + len(self._deletes)
+
+    def create_node(self, labels, properties):
+        # the uri is generated client-side, so arcs can point at the node before it exists
+        properties["uri"] = self.repo.generate_random_string()
+        labels = list(labels or [])
+        props = dict(properties)
+        self._nodes[props["uri"]] = (labels, props)
+        return TNode(None, props["uri"], labels, props)
+
+    def create_arc(self, node1_uri, node2_uri, rel_type):
+        self._arcs.append((node1_uri, node2_uri, rel_type))
+        return TArc(None, rel_type, node1_uri, node2_uri)
+
+    def update_node(self, uri, params_to_update):
+        if uri in self._nodes:
+            self._nodes[uri][1].update(params_to_update)
+        else:
+            self._updates.setdefault(uri, {}).update(params_to_update)
+
+    def delete_node_by_uri(self, uri):
+        self._arcs = [arc for arc in self._arcs if uri not in arc[:2]]
+        if self._nodes.pop(uri, None) is None:
+            self._updates.pop(uri, None)
+            self._deletes[uri] = None
+
+    @instrumented
+    def flush(self):
+        if not len(self):
+            return {"nodes": 0, "arcs": 0, "updated": 0, "deleted": 0}
+        node_groups = {}
+        for idx, (labels, props) in enumerate(self._nodes.values()):
+            node_groups.setdefault(tuple(labels), []).append({"idx": idx, "props": props})
+        counts = self.repo._write(
+            self._flush, node_groups, self.repo._group_arcs(self._arcs),
+            [{"uri": uri, "updates": updates} for uri, updates in self._updates.items()],
+            list(self._deletes),
+        )
+        self._reset()
+        return counts
+
+    def _flush(self, tx, node_groups, arc_groups, updates, deletes):
+        repo = self.repo
+        counts = {"nodes": 0, "arcs": 0, "updated": 0, "deleted": 0}
+        for labels, rows in node_groups.items():
+            query = repo._create_nodes_query(labels)
+            for chunk in repo._chunks(rows, repo.chunk_size):
+                counts["nodes"] += len(repo._records(tx, query, {"rows": chunk}))
+        for rel_type, rows in arc_groups.items():
+            query = repo._create_arcs_query(rel_type)
+            for chunk in repo._chunks(rows, repo.chunk_size):
+                counts["arcs"] += len(repo._records(tx, query, {"rows": chunk}))
+        for chunk in repo._chunks(updates, repo.chunk_size):
+            counts["updated"] += repo._records(tx, self.UPDATE_NODES_QUERY, {"rows": chunk})[0]["updated"]
+        for chunk in repo._chunks(deletes, repo.chunk_size):
+            counts["deleted"] += repo._records(tx, self.DELETE_NODES_QUERY, {"uris": chunk})[0]["deleted"]
+        return counts
+
+
+# repositories whose locks and events are replaced in a forked child
+_repositories = weakref.WeakSet()
+
+# Drivers a forked child inherited. They are kept alive for the life of the
+# child: once collected, their connections would say GOODBYE over sockets
+# the parent still uses.
+_inherited_drivers = []
+
+
+def _reset_after_fork():
+    for repo in list(_repositories):
+        if repo._driver_instance is not None:
+            _inherited_drivers.append(repo._driver_instance)
+        repo._reset_sync()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Neo4jRepository(Neo4jRepositoryBase):
+
+    HEALTH_CHECK_QUERY = "RETURN 1 AS ok"
+
+    def __init__(self, uri, user, password, chunk_size=Neo4jRepositoryBase.DEFAULT_CHUNK_SIZE,
+                 page_size=Neo4jRepositoryBase.DEFAULT_PAGE_SIZE, lazy=False, warm_up=0, **options):
+        self._driver_instance = None
+        self._driver_pid = None
+        self._reset_sync()
+        _repositories.add(self)
+        super().__init__(chunk_size, page_size, **options)
+        self.uri = uri
+        self._auth = (user, password)
+        # number of pooled connections opened in the background after connecting
+        self.warm_up = min(warm_up, self.driver_config["max_connection_pool_size"])
+        self.last_error = None
+        if self.causal_consistency:
+            self._bookmark_manager = GraphDatabase.bookmark_manager()
+        if lazy:
+            if self.warm_up:
+                threading.Thread(target=lambda: self._driver, daemon=True).start()
+            return
+        try:
+            self._driver.verify_connectivity()
+            self._ready.set()
+            print("Successfully connected to the Neo4j database.")
+        except (Neo4jError, DriverError) as error:
+            self.last_error = error
+            print(f"Failed to connect: {error}")
+
+    def _reset_sync(self):
+        # a lock inherited through fork() may be held by a thread that no longer exists
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._warm_up_done = threading.Event()
+
+    @property
+    def _driver(self):
+        if self._driver_pid != os.getpid():
+            with self._lock:
+                if self._driver_pid != os.getpid():
+                    self._connect()
+        return self._driver_instance
+
+    @_driver.setter
+    def _driver(self, driver):
+        self._driver_instance = driver
+        self._driver_pid = os.getpid() if driver is not None else None
+
+    def _connect(self):
+        # A driver inherited from the parent process shares its sockets, so it
+        # is left open in _inherited_drivers and this process gets its own pool.
+        self._ready = threading.Event()
+        self._warm_up_done = threading.Event()
+        self._driver = GraphDatabase.driver(self.uri, auth=self._auth, **self.driver_config)
+        if self.warm_up:
+            threading.Thread(
+                target=self._warm_up, args=(self._driver_instance, self._ready, self._warm_up_done),
+                daemon=True,
+            ).start()
+
+    def _warm_up(self, driver, ready, done):
+        # explicit transactions keep their connections until closed, so the pool
+        # really grows to warm_up connections
+        try:
+            with ExitStack() as stack:
+                for _ in range(self.warm_up):
+                    session = stack.enter_context(driver.session(**self._session_config()))
+                    tx = stack.enter_context(session.begin_transaction())
+                    tx.run(self.HEALTH_CHECK_QUERY).consume()
+            ready.set()
+        except (Neo4jError, DriverError) as error:
+            self.last_error = error
+        finally:
+            done.set()
+
+    def is_ready(self):
+        return self._driver_pid == os.getpid() and self._ready.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        # False once the warm-up or the health check has failed; see last_error
+        self._driver
+        if self.warm_up:
+            self._warm_up_done.wait(timeout)
+        elif not self._ready.is_set():
+            self.health_check()
+        return self._ready.is_set()
+
+    def health_check(self):
+        start = time.perf_counter()
+        status = {"ok": True, "error": None, "pid": os.getpid()}
+        try:
+            with self._driver.session(**self._session_config()) as session:
+                session.run(self.HEALTH_CHECK_QUERY).consume()
+            self._ready.set()
+        except (Neo4jError, DriverError) as error:
+            self.last_error = error
+            self._ready.clear()
+            status.update(ok=False, error=f"{type(error).__name__}: {error}")
+        status["latency_ms"] = (time.perf_counter() - start) * 1000
+        return status
+
+    def unit_of_work(self):
+        return UnitOfWork(self)
+
+    def close(self):
+        if self._driver_instance is not None and self._driver_pid == os.getpid():
+            self._driver_instance.close()
+            print("Database connection closed.")
+        self._driver = None
+
+    def _session(self):
+        if not self._base_label_migrated:
+            self._migrate_base_label()
+        return self._driver.session(**self._session_config())
+
+    def _migrate_base_label(self):
+        # one label scan per repository; safe to repeat if two threads race here
+        with self._driver.session(**self._session_config()) as session:
+            session.run(self._base_label_statement()).consume()
+        self._base_label_migrated = True
+
+    def _read(self, work, *args):
+        with self._session() as session:
+            return session.execute_read(work, *args)
+
+    def _write(self, work, *args):
+        with self._session() as session:
+            return session.execute_write(work, *args)
+
+    def _next_version(self, tx):
+        if not self.track_changes:
+            return None
+        return tx.run(self.NEXT_VERSION_QUERY).single()["version"]
+
+    def _records(self, tx, query, params, profile=True):
+        if self._with_version(query, params):
+            # allocated inside the caller's transaction, so versions follow commit order
+            params = {**params, "version": self._next_version(tx)}
+        if self.metrics is None:
+            return list(tx.run(query, **params))
+        start = time.perf_counter()
+        result = tx.run(self._profiled(query) if profile else query, **params)
+        records = list(result)
+        self._record_query(query, start, records, result.consume())
+        return records
+
+    def _read_query(self, query, params=None):
+        return self._read(self._records, query, params or {})
+
+    def _write_query(self, query, params=None):
+        return self._write(self._records, query, params or {})
+
+    @instrumented
+    def create_node(self, labels, properties):
+        properties["uri"] = self.generate_random_string()
+        records = self._write_query(self._create_node_query(labels), {"props": properties})
+        if records:
+            return self._extract_node(records[0]["a"])
+        return None
+
+    @instrumented
+    def create_nodes(self, batch, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        batch = list(batch)
+        created = [None] * len(batch)
+        for labels, rows in self._group_nodes(batch).items():
+            for chunk in self._chunks(rows, chunk_size):
+                for idx, node in self._write(self._create_nodes_chunk, labels, chunk):
+                    created[idx] = node
+        return created
+
+    def _create_nodes_chunk(self, tx, labels, rows):
+        records = self._records(tx, self._create_nodes_query(labels), {"rows": rows})
+        return [(rec["idx"], self._extract_node(rec["a"])) for rec in records]
+
+    @instrumented
+    def get_nodes_by_labels(self, labels):
+        if not labels:
+            return []
+        records = self._read_query(self._nodes_by_labels_query(labels))
+        return [self._extract_node(record["a"]) for record in records]
+
+    def _fetch_nodes_with_arcs(self, tx, uris=None):
+        if not uris:
+            return [node for page in self.iter_node_pages() for node in page]
+        return self._nodes_with_arcs(
+            self._records(tx, self.FETCH_NODES_BY_URIS_QUERY, {"uris": uris})
+        )
+
+    def _fetch_nodes_page(self, tx, after, limit):
+        return self._nodes_with_arcs(
+            self._records(tx, self.FETCH_NODES_PAGE_QUERY, {"after": after, "limit": limit})
+        )
+
+    @instrumented
+    def iter_node_pages(self, page_size=None):
+        page_size = page_size or self.page_size
+        after = ""
+        while True:
+            page = self._read(self._fetch_nodes_page, after, page_size)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = page[-1]["uri"]
+
+    @instrumented
+    def iter_nodes_and_arcs(self, page_size=None):
+        for page in self.iter_node_pages(page_size):
+            yield from page
+
+    @instrumented
     def get_all_nodes(self):
-        query = "MATCH (a) RETURN a"
-        with self._driver.session() as session:
-            records = session.run(query)
-            return [self._extract_node(rec["a"]) for rec in records]
+        records = self._read_query(self.GET_ALL_NODES_QUERY)
+        return [self._extract_node(rec["a"]) for rec in records]
 
+    @instrumented
     def get_all_nodes_and_arcs(self):
-        with self._driver.session() as session:
-            return self._fetch_nodes_with_arcs(session)
+        return list(self.iter_nodes_and_arcs())
 
-    def get_node_by_uri(self, uri):
-        with self._driver.session() as session:
-            nodes = self._fetch_nodes_with_arcs(session, uris=[uri])
+    @instrumented
+    def get_node_by_uri(self, uri, fields=None, arc_types=None, direction="out", arc_limit=None,
+                        lazy=False):
+        if not lazy and self._default_read(fields, arc_types, direction, arc_limit):
+            nodes = self._read(self._fetch_nodes_with_arcs, [uri])
             if nodes:
                 return nodes[0]
             return None
+        query = self._node_query(fields, arc_types, direction, arc_limit, with_arcs=not lazy)
+        records = self._read_query(query, {"uri": uri, "arc_limit": arc_limit})
+        if not records:
+            return None
+        node = self._projected_node(records[0])
+        if lazy:
+            node["arcs"] = self._lazy_arcs(uri, arc_types, direction, None, arc_limit)
+        return node
+
+    def _fetch_arcs_page(self, tx, query, uri, skip, limit):
+        records = self._records(tx, query, {"uri": uri, "skip": skip, "limit": limit})
+        return [self._arc_from_map(rec["arc"]) for rec in records]
 
+    def _lazy_arcs(self, uri, arc_types, direction, page_size, limit=None):
+        query = self._arcs_page_query(arc_types, direction)
+        return LazyArcs(
+            lambda skip, size: self._read(self._fetch_arcs_page, query, uri, skip, size),
+            page_size or self.page_size, limit,
+        )
+
+    def iter_arcs(self, uri, arc_types=None, direction="out", page_size=None):
+        return iter(self._lazy_arcs(uri, arc_types, direction, page_size))
+
+    @instrumented
     def create_arc(self, node1_uri, node2_uri, rel_type):
-        query = f"""
-            MATCH (a {{uri: $uri1}}), (b {{uri: $uri2}})
-            CREATE (a)-[r:`{rel_type}`]->(b)
-            RETURN r, a, b
-        """
-        with self._driver.session() as session:
-            result = session.run(query, uri1=node1_uri, uri2=node2_uri).single()
-            if result:
-                rel = result["r"]
-                start_node = result["a"]
-                end_node = result["b"]
-                return {
-                    "id": rel.element_id,
-                    "uri": rel.type,
-                    "node_uri_from": start_node.get("uri"),
-                    "node_uri_to": end_node.get("uri"),
-                }
-            return None
+        records = self._write_query(self._create_arc_query(rel_type), {"uri1": node1_uri, "uri2": node2_uri})
+        if records:
+            return self._extract_arc(records[0]["r"])
+        return None
+
+    @instrumented
+    def create_arcs(self, batch, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        batch = list(batch)
+        created = [None] * len(batch)
+        for rel_type, rows in self._group_arcs(batch).items():
+            for chunk in self._chunks(rows, chunk_size):
+                for idx, arc in self._write(self._create_arcs_chunk, rel_type, chunk):
+                    created[idx] = arc
+        return created
 
+    def _create_arcs_chunk(self, tx, rel_type, rows):
+        records = self._records(tx, self._create_arcs_query(rel_type), {"rows": rows})
+        return [(rec["idx"], self._extract_arc(rec["r"])) for rec in records]
+
+    def _merged_count(self, tx, query, rows):
+        records = self._records(tx, query, {"rows": rows})
+        return records[0]["merged"] if records else 0
+
+    @instrumented
+    def merge_nodes(self, batch, chunk_size=None):
+        # idempotent counterpart of create_nodes: properties must carry the uri
+        chunk_size = chunk_size or self.chunk_size
+        merged = 0
+        for labels, rows in self._group_merge_nodes(batch).items():
+            query = self._merge_nodes_query(labels)
+            for chunk in self._chunks(rows, chunk_size):
+                merged += self._write(self._merged_count, query, chunk)
+        return merged
+
+    @instrumented
+    def merge_arcs(self, batch, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        merged = 0
+        for rel_type, rows in self._group_arcs(batch).items():
+            query = self._merge_arcs_query(rel_type)
+            for chunk in self._chunks(rows, chunk_size):
+                merged += self._write(self._merged_count, query, chunk)
+        return merged
+
+    @instrumented
     def delete_node_by_uri(self, uri):
-        cypher = """
-            MATCH (n {uri: $uri})
-            DETACH DELETE n
-            RETURN count(n) as deleted_count
-        """
-        with self._driver.session() as session:
-            result = session.run(cypher, uri=uri).single()
-            if result:
-                return result["deleted_count"] > 0
-            return False
+        records = self._write_query(self.DELETE_NODE_QUERY, {"uri": uri})
+        if records:
+            return records[0]["deleted_count"] > 0
+        return False
 
+    @instrumented
     def delete_arc_by_id(self, arc_id):
-        cypher = """
-            MATCH ()-[r]-() WHERE elementId(r) = $id
-            DELETE r
-            RETURN count(r) as deleted_count
-        """
-        with self._driver.session() as session:
-            result = session.run(cypher, id=str(arc_id)).single()
-            if result:
-                return result["deleted_count"] > 0
-            return False
+        records = self._write_query(self.DELETE_ARC_QUERY, {"id": str(arc_id)})
+        if records:
+            return records[0]["deleted_count"] > 0
+        return False
 
+    @instrumented
     def update_node(self, uri, params_to_update):
         if not params_to_update:
             return self.get_node_by_uri(uri)
-        cypher = """
-            MATCH (n {uri: $uri})
-            SET n += $updates
-            RETURN n
-        """
-        with self._driver.session() as session:
-            result = session.run(cypher, uri=uri, updates=params_to_update).single()
-            if result:
-                return self._extract_node(result["n"])
-            return None
+        records = self._write_query(self.UPDATE_NODE_QUERY, {"uri": uri, "updates": params_to_update})
+        if records:
+            return self._extract_node(records[0]["n"])
+        return None
+
+    @instrumented
+    def ensure_schema(self, labels=()):
+        # schema commands and CALL ... IN TRANSACTIONS need auto-commit transactions
+        with self._session() as session:
+            for statement in self._schema_statements(labels):
+                self._records(session, statement, {}, profile=False)
+
+    @instrumented
+    def export_csr(self, page_size=None):
+        return export_graph_csr(self, page_size)
+
+    @instrumented
+    def current_version(self):
+        return self._read_query(self.CURRENT_VERSION_QUERY)[0]["version"]
+
+    def _fetch_changes_page(self, tx, version, after, limit):
+        return self._changes(self._records(
+            tx, self.CHANGES_PAGE_QUERY, {"version": version, "after": after, "limit": limit}
+        ))
+
+    @instrumented
+    def changes_since(self, version=0, page_size=None):
+        page_size = page_size or self.page_size
+        # a null uri keeps the first page strictly after `version`
+        after = None
+        while True:
+            page = self._read(self._fetch_changes_page, version, after, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            version, after = page[-1]["version"], page[-1]["uri"]
+
+    @instrumented
+    def purge_tombstones(self, before_version):
+        return self.run_auto_commit_query(self.PURGE_TOMBSTONES_QUERY, {"before": before_version})[0]["purged"]
+
+    @instrumented
+    def explain(self, query, params=None):
+        with self._session() as session:
+            return session.run("EXPLAIN " + query, params or {}).consume().plan
+
+    @instrumented
+    def run_auto_commit_query(self, query, params=None):
+        # for CALL { ... } IN TRANSACTIONS, which cannot run inside a managed transaction
+        with self._session() as session:
+            return self._records(session, query, params or {}, profile=False)
 
-    def run_custom_query(self, query, params=None):
-        params = params or {}
-        with self._driver.session() as session:
-            result = session.run(query, **params)
-            return [record for record in result]
\ No newline at end of file
+    @instrumented
+    def run_custom_query(self, query, params=None, write=True):
+        if write:
+            return self._write_query(query, params)
+        return self._read_query(query, params)
@@ -1,5 +1,9 @@
+import asyncio
+import json
 import unittest
 from neo4j_repo import Neo4jRepository
+from async_neo4j_repo import AsyncNeo4jRepository
+from instrumentation import QueryMetrics
 from neo4j import GraphDatabase
 
 uri = "bolt://localhost:7687"
@@ -110,5 +114,249 @@ class TestNeo4jOperations(unittest.TestCase):
         author_data = self.repo.get_node_by_uri(author["uri"])
         self.assertEqual(len(author_data["arcs"]), 0)
 
+    def test_bulk_create_nodes_and_arcs(self):
+        """Пакетно создать узлы и дуги."""
+        nodes = self.repo.create_nodes(
+            [(["User"], {"name": f"User {i}"}) for i in range(5)]
+            + [(["Article"], {"title": f"Post {i}"}) for i in range(5)],
+            chunk_size=2,
+        )
+        self.assertEqual(len(nodes), 10)
+        self.assertIn("User", nodes[0]["labels"])
+        self.assertEqual(nodes[7]["properties"]["title"], "Post 2")
+
+        arcs = self.repo.create_arcs(
+            [(nodes[i]["uri"], nodes[i + 5]["uri"], "AUTHORED") for i in range(5)],
+            chunk_size=2,
+        )
+        self.assertEqual([arc["uri"] for arc in arcs], ["AUTHORED"] * 5)
+        self.assertEqual(arcs[3]["node_uri_from"], nodes[3]["uri"])
+        self.assertEqual(arcs[3]["node_uri_to"], nodes[8]["uri"])
+
+    def test_schema_uses_uri_index(self):
+        """URI узлов уникальны после создания схемы."""
+        self.repo.ensure_schema(["Article"])
+        article = self.repo.create_node(["Article"], {"title": "Indexed"})
+        self.assertNotIn("Resource", article["labels"])
+        with self.assertRaises(Exception):
+            self.repo.run_custom_query(
+                "CREATE (n:Resource {uri: $uri})", {"uri": article["uri"]}
+            )
+        with self.assertRaises(Exception):
+            self.repo.run_custom_query("CREATE (:Tombstone {uri: 'dup'}), (:Tombstone {uri: 'dup'})")
+
+    def test_legacy_nodes_get_base_label(self):
+        """Узлы без базовой метки находятся по uri после первого обращения."""
+        self.repo.run_custom_query("CREATE (:Article {uri: 'legacy-1', title: 'Legacy'})")
+        repo = Neo4jRepository(uri, user, password)
+        try:
+            node = repo.get_node_by_uri("legacy-1")
+            self.assertEqual(node["properties"]["title"], "Legacy")
+            self.assertTrue(repo.delete_node_by_uri("legacy-1"))
+        finally:
+            repo.close()
+
+    def test_iterate_nodes_in_pages(self):
+        """Постранично обойти все узлы вместе с дугами."""
+        author = self.repo.create_node(["User"], {"name": "Dana"})
+        articles = self.repo.create_nodes([(["Article"], {"title": f"Page {i}"}) for i in range(7)])
+        self.repo.create_arcs([(author["uri"], a["uri"], "AUTHORED") for a in articles])
+
+        pages = list(self.repo.iter_node_pages(page_size=3))
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        uris = [node["uri"] for page in pages for node in page]
+        self.assertEqual(uris, sorted(uris))
+
+        dana = next(n for n in self.repo.iter_nodes_and_arcs(page_size=3) if n["uri"] == author["uri"])
+        self.assertEqual(len(dana["arcs"]), 7)
+        self.assertEqual({arc["node_uri_to"] for arc in dana["arcs"]}, {a["uri"] for a in articles})
+
+    def test_causal_read_after_write(self):
+        """Чтение в новой сессии видит только что записанный узел."""
+        repo = Neo4jRepository(uri, user, password, causal_consistency=True,
+                               max_connection_pool_size=5, connection_acquisition_timeout=5.0)
+        try:
+            article = repo.create_node(["Article"], {"title": "Consistent"})
+            fetched = repo.get_node_by_uri(article["uri"])
+            self.assertEqual(fetched["properties"]["title"], "Consistent")
+            titles = [rec["t"] for rec in repo.run_custom_query(
+                "MATCH (a:Article) RETURN a.title AS t", write=False)]
+            self.assertIn("Consistent", titles)
+        finally:
+            repo.close()
+
+    def test_compact_result_records(self):
+        """Узлы и дуги — компактные объекты со словарным доступом."""
+        user_node = self.repo.create_node(["User"], {"name": "Frank"})
+        article = self.repo.create_node(["Article"], {"title": "Slots"})
+        self.repo.create_arc(user_node["uri"], article["uri"], "AUTHORED")
+        node = self.repo.get_node_by_uri(user_node["uri"])
+        self.assertFalse(hasattr(node, "__dict__"))
+        # свойства собираются в словарь только при первом обращении
+        self.assertIsNone(node._properties)
+        self.assertEqual(node["labels"], ["User"])
+        self.assertEqual(node.properties["name"], "Frank")
+        self.assertEqual(node["arcs"][0]["node_uri_to"], article["uri"])
+        self.assertEqual(set(node.to_dict()), {"id", "uri", "labels", "properties", "arcs"})
+        self.assertEqual(dict(node)["uri"], user_node["uri"])
+        self.assertEqual(json.loads(json.dumps(node.to_dict()))["arcs"][0]["uri"], "AUTHORED")
+
+    def test_unit_of_work(self):
+        """Отложенная запись нескольких операций одной транзакцией."""
+        existing = self.repo.create_node(["User"], {"name": "Grace"})
+        with self.repo.unit_of_work() as uow:
+            author = uow.create_node(["User"], {"name": "Heidi"})
+            post = uow.create_node(["Article"], {"title": "Draft"})
+            uow.create_arc(author["uri"], post["uri"], "AUTHORED")
+            uow.update_node(post["uri"], {"title": "Final"})
+            uow.update_node(existing["uri"], {"name": "Grace H."})
+            uow.update_node(existing["uri"], {"age": 30})
+            # до выхода из контекста ничего не записано
+            self.assertIsNone(self.repo.get_node_by_uri(author["uri"]))
+
+        self.assertEqual(self.repo.get_node_by_uri(post["uri"])["properties"]["title"], "Final")
+        self.assertEqual(self.repo.get_node_by_uri(author["uri"])["arcs"][0]["node_uri_to"], post["uri"])
+        grace = self.repo.get_node_by_uri(existing["uri"])["properties"]
+        self.assertEqual((grace["name"], grace["age"]), ("Grace H.", 30))
+
+    def test_change_feed(self):
+        """Лента изменений отдаёт только изменения после указанной версии."""
+        repo = Neo4jRepository(uri, user, password, track_changes=True)
+        try:
+            repo.ensure_schema()
+            start = repo.current_version()
+            user_node = repo.create_node(["User"], {"name": "Ivan"})
+            article = repo.create_node(["Article"], {"title": "Feed"})
+            repo.create_arc(user_node["uri"], article["uri"], "AUTHORED")
+            repo.delete_node_by_uri(article["uri"])
+            # повторная миграция схемы не превращает надгробия в узлы графа
+            repo.ensure_schema()
+            self.assertIsNone(repo.get_node_by_uri(article["uri"]))
+            # служебные узлы ленты не попадают в выборку всех узлов
+            labels = {label for node in repo.get_all_nodes() for label in node["labels"]}
+            self.assertFalse(labels & {"Tombstone", "ChangeSequence"})
+
+            changes = list(repo.changes_since(start, page_size=1))
+            self.assertEqual(len([c for c in changes if c["uri"] == article["uri"]]), 1)
+            self.assertEqual([c["version"] for c in changes], sorted(c["version"] for c in changes))
+            by_uri = {c["uri"]: c for c in changes}
+            self.assertTrue(by_uri[article["uri"]]["deleted"])
+            self.assertEqual(by_uri[user_node["uri"]]["node"]["arcs"], [])
+            # автор входящей дуги помечен той же версией, что и удаление
+            self.assertEqual(by_uri[user_node["uri"]]["version"], by_uri[article["uri"]]["version"])
+
+            latest = repo.current_version()
+            self.assertEqual(list(repo.changes_since(latest)), [])
+            repo.update_node(user_node["uri"], {"name": "Ivan P."})
+            self.assertEqual([c["uri"] for c in repo.changes_since(latest)], [user_node["uri"]])
+            # запись без отслеживания изменений не стирает версию узла
+            self.repo.update_node(user_node["uri"], {"name": "Ivan Petrov"})
+            self.assertEqual([c["uri"] for c in repo.changes_since(latest)], [user_node["uri"]])
+        finally:
+            repo.close()
+
+    def test_projection_and_lazy_arcs(self):
+        """Чтение узла с выборкой полей, фильтром дуг и ленивой подгрузкой."""
+        hub = self.repo.create_node(["Tag"], {"title": "Hub", "body": "x" * 1000})
+        posts = self.repo.create_nodes([(["Article"], {"title": f"Tagged {i}"}) for i in range(5)])
+        self.repo.create_arcs([(p["uri"], hub["uri"], "TAGGED") for p in posts])
+        self.repo.create_arc(hub["uri"], posts[0]["uri"], "FEATURES")
+
+        node = self.repo.get_node_by_uri(hub["uri"], fields=["title"], arc_types=["TAGGED"],
+                                         direction="in", arc_limit=2)
+        self.assertEqual(node["properties"], {"uri": hub["uri"], "title": "Hub"})
+        self.assertEqual(len(node["arcs"]), 2)
+        self.assertTrue(all(arc["node_uri_to"] == hub["uri"] for arc in node["arcs"]))
+
+        lazy = self.repo.get_node_by_uri(hub["uri"], direction="both", lazy=True)
+        self.assertEqual(lazy["labels"], ["Tag"])
+        self.assertEqual(len(list(self.repo.iter_arcs(hub["uri"], direction="both", page_size=2))), 6)
+        self.assertEqual({arc["uri"] for arc in lazy["arcs"]}, {"TAGGED", "FEATURES"})
+
+    def test_lazy_connect_and_health(self):
+        """Ленивое подключение, прогрев пула и проверки готовности."""
+        repo = Neo4jRepository(uri, user, password, lazy=True, warm_up=2)
+        try:
+            self.assertTrue(repo.wait_until_ready(timeout=10))
+            self.assertTrue(repo.health_check()["ok"])
+            self.assertIsNotNone(repo.create_node(["Article"], {"title": "Lazy"}))
+        finally:
+            repo.close()
+
+        unreachable = Neo4jRepository("bolt://localhost:1", user, password, lazy=True)
+        status = unreachable.health_check()
+        self.assertFalse(status["ok"])
+        self.assertIn("ServiceUnavailable", status["error"])
+        self.assertFalse(unreachable.is_ready())
+
+        # неудачный прогрев завершает ожидание, а не блокирует его навсегда
+        failing = Neo4jRepository("bolt://localhost:1", user, password, lazy=True, warm_up=1)
+        self.assertFalse(failing.wait_until_ready())
+        self.assertIsNotNone(failing.last_error)
+
+        # недоступный сервер при обычном подключении не роняет конструктор
+        eager = Neo4jRepository("bolt://localhost:1", user, password)
+        self.assertEqual(type(eager.last_error).__name__, "ServiceUnavailable")
+        self.assertFalse(eager.is_ready())
+
+    def test_query_metrics(self):
+        """Собрать метрики и план выполнения запросов."""
+        metrics = QueryMetrics(slow_query_ms=0, profile=True)
+        samples = []
+        metrics.add_listener(samples.append)
+        self.repo.metrics = metrics
+        try:
+            article = self.repo.create_node(["Article"], {"title": "Measured"})
+            self.repo.get_node_by_uri(article["uri"])
+            # потоковый метод учитывается после исчерпания генератора
+            list(self.repo.iter_nodes_and_arcs())
+        finally:
+            self.repo.metrics = None
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["calls"]["create_node"]["count"], 1)
+        self.assertEqual(snapshot["calls"]["iter_nodes_and_arcs"]["count"], 1)
+        self.assertNotIn("iter_node_pages", snapshot["calls"])
+        self.assertEqual(snapshot["queries"]["get_node_by_uri"]["rows"], 1)
+        self.assertGreater(snapshot["queries"]["get_node_by_uri"]["db_hits"], 0)
+        self.assertEqual([s["operation"] for s in samples],
+                         ["create_node", "get_node_by_uri", "iter_nodes_and_arcs"])
+        self.assertIsNotNone(samples[1]["plan"])
+        self.assertEqual(len(metrics.slow_queries), 3)
+
+
+class TestAsyncNeo4jOperations(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.repo = AsyncNeo4jRepository(uri, user, password, max_concurrency=4)
+        await self.repo.verify_connectivity()
+        await self.repo.run_custom_query("MATCH (n) DETACH DELETE n")
+
+    async def asyncTearDown(self):
+        await self.repo.close()
+
+    async def test_concurrent_reads(self):
+        """Параллельно прочитать статьи через asyncio.gather."""
+        articles = await self.repo.create_nodes(
+            [(["Article"], {"title": f"Async {i}"}) for i in range(10)]
+        )
+        fetched = await asyncio.gather(
+            *(self.repo.get_node_by_uri(a["uri"]) for a in articles)
+        )
+        self.assertEqual(
+            [n["properties"]["title"] for n in fetched],
+            [f"Async {i}" for i in range(10)],
+        )
+
+    async def test_async_arc_roundtrip(self):
+        """Создать и удалить дугу через асинхронный репозиторий."""
+        author = await self.repo.create_node(["User"], {"name": "Eve"})
+        article = await self.repo.create_node(["Article"], {"title": "Async post"})
+        rel = await self.repo.create_arc(author["uri"], article["uri"], "AUTHORED")
+        self.assertEqual(rel["node_uri_to"], article["uri"])
+        self.assertTrue(await self.repo.delete_arc_by_id(rel["id"]))
+        author_data = await self.repo.get_node_by_uri(author["uri"])
+        self.assertEqual(author_data["arcs"], [])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,190 @@
+import argparse
+import json
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from neo4j_driver.neo4j_repo import Neo4jRepository
+from ontology_repo import OntologyRepository
+
+try:
+    from testcontainers.neo4j import Neo4jContainer
+except ImportError:
+    Neo4jContainer = None
+
+uri = "bolt://localhost:7687"
+user = "neo4j"
+password = "testpassword"
+
+
+class LatencyRecorder:
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def measure(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(operation, []).append(time.perf_counter() - start)
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+        return ordered[index]
+
+    def report(self):
+        report = {}
+        for operation, samples in self.samples.items():
+            ordered = sorted(samples)
+            total = sum(ordered)
+            report[operation] = {
+                "count": len(ordered),
+                "total_s": round(total, 6),
+                "ops_per_s": round(len(ordered) / total, 2) if total else None,
+                "p50_ms": round(self._percentile(ordered, 0.50) * 1000, 3),
+                "p95_ms": round(self._percentile(ordered, 0.95) * 1000, 3),
+                "p99_ms": round(self._percentile(ordered, 0.99) * 1000, 3),
+            }
+        return report
+
+
+def build_ontology(repo, recorder, depth, fanout, props_per_class, objects_per_class):
+    classes = []
+    level = [None]
+    for d in range(depth):
+        next_level = []
+        for parent_uri in level:
+            for i in range(fanout if parent_uri else 1):
+                with recorder.measure("create_class"):
+                    node = repo.create_class(f"Class {d}.{len(next_level)}", "synthetic", parent_uri)
+                next_level.append(node["uri"])
+        classes.extend(next_level)
+        level = next_level
+
+    for class_uri in classes:
+        for p in range(props_per_class):
+            repo.add_class_attribute(class_uri, f"field_{p}")
+
+    objects = []
+    for class_uri in classes:
+        for o in range(objects_per_class):
+            properties = {"title": f"Object {o}", "description": "synthetic"}
+            properties.update({f"field_{p}": p * o for p in range(props_per_class)})
+            with recorder.measure("create_object"):
+                obj = repo.create_object(class_uri, properties)
+            objects.append(obj["uri"])
+    return classes, objects
+
+
+def prepare_database(neo, wipe=False):
+    if wipe:
+        neo.run_custom_query("MATCH (n) DETACH DELETE n")
+    elif neo.run_custom_query("MATCH (n) RETURN n LIMIT 1", write=False):
+        raise RuntimeError(
+            "The database is not empty; pass --wipe to clear it or --container to use a disposable one"
+        )
+
+
+def run_benchmark(neo, depth, fanout, props_per_class, objects_per_class, lookups, seed, wipe=False):
+    rnd = random.Random(seed)
+    repo = OntologyRepository(neo)
+    recorder = LatencyRecorder()
+    prepare_database(neo, wipe)
+    repo.ensure_schema()
+
+    classes, objects = build_ontology(
+        repo, recorder, depth, fanout, props_per_class, objects_per_class
+    )
+    node_uris = classes + objects
+
+    for node_uri in rnd.choices(node_uris, k=lookups):
+        with recorder.measure("get_node_by_uri"):
+            neo.get_node_by_uri(node_uri)
+
+    with recorder.measure("get_all_nodes_and_arcs"):
+        neo.get_all_nodes_and_arcs()
+
+    for class_uri in rnd.choices(classes, k=lookups):
+        with recorder.measure("collect_signature"):
+            repo.collect_signature(class_uri)
+
+    # delete the leaves first so every call removes a comparable subtree
+    for class_uri in reversed(classes):
+        with recorder.measure("delete_class"):
+            repo.delete_class(class_uri)
+
+    return {
+        "config": {
+            "depth": depth,
+            "fanout": fanout,
+            "props_per_class": props_per_class,
+            "objects_per_class": objects_per_class,
+            "lookups": lookups,
+            "seed": seed,
+            "classes": len(classes),
+            "objects": len(objects),
+        },
+        "commit": current_commit(),
+        "results": recorder.report(),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark repository hot paths")
+    parser.add_argument("--uri", default=uri)
+    parser.add_argument("--user", default=user)
+    parser.add_argument("--password", default=password)
+    parser.add_argument("--container", action="store_true",
+                        help="start a disposable Neo4j through testcontainers")
+    parser.add_argument("--wipe", action="store_true",
+                        help="delete every node of the target database before the run")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--props", type=int, default=3)
+    parser.add_argument("--objects", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    container = None
+    if args.container:
+        if Neo4jContainer is None:
+            parser.error("--container needs the testcontainers package")
+        container = Neo4jContainer(password=args.password).start()
+        args.uri = container.get_connection_url()
+
+    neo = Neo4jRepository(args.uri, args.user, args.password)
+    try:
+        report = run_benchmark(neo, args.depth, args.fanout, args.props, args.objects,
+                               args.lookups, args.seed, args.wipe)
+    finally:
+        neo.close()
+        if container is not None:
+            container.stop()
+
+    data = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data)
+    print(data)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,132 +1,886 @@
-from neo4j_driver.neo4j_repo import Neo4jRepository
+from neo4j_driver.neo4j_repo import Neo4jRepository, BASE_LABEL, TOMBSTONE_CLAUSE, CHUNKED_TOMBSTONE_CLAUSE
+import re
+from neo4j_driver.instrumentation import instrumented, plan_operators
+from neo4j_driver.graph_io import export_graph, import_graph
+from neo4j_driver.graph_csr import CSRBuilder
+from class_cache import ClassHierarchyCache
+from class_closure import ClassClosureIndex
 
 
-class OntologyRepository:
+class OntologyRepositoryBase:
 
-    def __init__(self, neo_repo: Neo4jRepository):
+    SCHEMA_LABELS = ("Class", "Object", "DatatypeProperty", "ObjectProperty", "Value")
+    ROOTS_KEY = ("roots",)
+    OBJECT_FIELDS = ("uri", "title", "description", "_version")
+    # generated and maintained by the repository, never set by callers
+    RESERVED_FIELDS = ("uri", "_version")
+
+    # deepest classes first: every descendant of a class lies deeper than the class itself
+    SUBTREE_CLASSES_QUERY = """
+        MATCH p = (c:Class {uri:$uri})<-[:SUBCLASS_OF*0..]-(child:Class)
+        WITH child, max(length(p)) AS depth
+        ORDER BY depth DESC
+        RETURN collect(child.uri) AS class_uris
+    """
+
+    # Dependents go first and classes are deleted deepest first, down to the
+    # root class itself, so an interrupted delete never leaves orphans behind
+    # and can be run again from the same root.
+    DELETE_SUBTREE_STEPS = (
+        ("values", """
+            MATCH (c:Class)<-[:RDF_TYPE]-(:Object)-[:HAS_VALUE]->(n:Value)
+            WHERE c.uri IN $uris
+            WITH DISTINCT n
+        """),
+        ("objects", """
+            MATCH (c:Class)<-[:RDF_TYPE]-(n:Object)
+            WHERE c.uri IN $uris
+            WITH DISTINCT n
+        """),
+        ("properties", """
+            MATCH (c:Class)-[:DOMAIN]->(n)
+            WHERE c.uri IN $uris AND (n:DatatypeProperty OR n:ObjectProperty)
+            WITH DISTINCT n
+        """),
+        ("classes", """
+            UNWIND range(0, size($uris) - 1) AS i
+            MATCH (n:Class {uri: $uris[i]})
+            WITH n ORDER BY i
+        """),
+    )
+
+    ROOT_CLASSES_QUERY = """
+        MATCH (c:Class)
+        WHERE NOT (c)-[:SUBCLASS_OF]->(:Class)
+        RETURN c
+    """
+
+    CLASS_PARENTS_QUERY = """
+        MATCH (c:Class {uri:$uri})-[:SUBCLASS_OF]->(p:Class)
+        RETURN p
+    """
+
+    CLASS_CHILDREN_QUERY = """
+        MATCH (p:Class {uri:$uri})<-[:SUBCLASS_OF]-(c:Class)
+        RETURN c
+    """
+
+    CLASS_CLOSURE_QUERY = """
+        MATCH (c:Class)
+        OPTIONAL MATCH (c)-[:SUBCLASS_OF]->(p:Class)
+        RETURN c.uri AS uri, collect(p.uri) AS parents
+    """
+
+    CLASSES_BY_URIS_QUERY = """
+        MATCH (c:Class) WHERE c.uri IN $uris
+        RETURN c
+    """
+
+    DELETE_CLASS_ATTRIBUTE_QUERY = f"""
+        MATCH (c:Class {{uri:$uri}})-[:DOMAIN]->(n:DatatypeProperty {{title:$title}})
+        SET c._version = coalesce($version, c._version)
+        {TOMBSTONE_CLAUSE}
+        DETACH DELETE n
+    """
+
+    DELETE_CLASS_OBJECT_ATTRIBUTE_QUERY = f"""
+        MATCH (n:ObjectProperty {{uri:$uri}})
+        OPTIONAL MATCH (c:Class)-[:DOMAIN]->(n)
+        SET c._version = coalesce($version, c._version)
+        WITH n, collect(c.uri) AS class_uris
+        {TOMBSTONE_CLAUSE}
+        DETACH DELETE n
+        RETURN class_uris
+    """
+
+    SIGNATURE_QUERY = """
+        MATCH (c:Class {uri:$uri})
+        OPTIONAL MATCH (c)-[:DOMAIN]->(dp:DatatypeProperty)
+        OPTIONAL MATCH (c)-[:DOMAIN]->(op:ObjectProperty)-[:RANGE]->(rc:Class)
+        WITH collect(distinct {title: dp.title, kind:'datatype'}) as dprops,
+             collect(distinct {title: op.title, kind:'object', range_title: rc.title, range_uri: rc.uri}) as oprops
+        RETURN dprops, oprops
+    """
+
+    DIRECT_SIGNATURES_QUERY = """
+        UNWIND $uris AS uri
+        MATCH (c:Class {uri:uri})
+        OPTIONAL MATCH (c)-[:DOMAIN]->(dp:DatatypeProperty)
+        WITH c, collect(distinct {title: dp.title, kind:'datatype'}) as dprops
+        OPTIONAL MATCH (c)-[:DOMAIN]->(op:ObjectProperty)-[:RANGE]->(rc:Class)
+        WITH c, dprops,
+             collect(distinct {title: op.title, kind:'object', range_title: rc.title, range_uri: rc.uri}) as oprops
+        RETURN c.uri AS uri, dprops, oprops
+    """
+
+    OBJECT_CLASS_QUERY = """
+        MATCH (o:Object {uri:$uri})-[:RDF_TYPE]->(c:Class)
+        RETURN c.uri AS class_uri
+    """
+
+    OBJECT_ATTRIBUTES_QUERY = """
+        MATCH (o:Object {uri:$uri})
+        OPTIONAL MATCH (o)-[:HAS_VALUE]->(v:Value)
+        RETURN properties(o) AS props, collect({title: v.title, value: v.value}) AS values
+    """
+
+    # Value nodes not migrated yet still count, but an inline property with the
+    # same title wins; writes drop those Values so a later migration can't
+    # bring an older value back over the inline one.
+    INLINE_ATTRIBUTES_QUERY = """
+        MATCH (o:Object {uri:$uri})
+        OPTIONAL MATCH (o)-[:HAS_VALUE]->(v:Value) WHERE o[v.title] IS NULL
+        RETURN properties(o) AS props, collect({title: v.title, value: v.value}) AS values
+    """
+
+    SET_INLINE_ATTRIBUTES_QUERY = f"""
+        MATCH (o:Object {{uri:$uri}})
+        SET o += $values, o._version = coalesce($version, o._version)
+        WITH o
+        OPTIONAL MATCH (o)-[:HAS_VALUE]->(n:Value) WHERE n.title IN keys($values)
+        {TOMBSTONE_CLAUSE}
+        DETACH DELETE n
+        WITH DISTINCT o
+        OPTIONAL MATCH (o)-[:HAS_VALUE]->(v:Value) WHERE o[v.title] IS NULL
+        RETURN properties(o) AS props, collect({{title: v.title, value: v.value}}) AS values
+    """
+
+    REPLACE_VALUE_NODES_QUERY = f"""
+        MATCH (o:Object {{uri:$uri}})
+        SET o += $fields, o._version = coalesce($version, o._version)
+        WITH o
+        OPTIONAL MATCH (o)-[:HAS_VALUE]->(n:Value) WHERE n.title IN $titles
+        {TOMBSTONE_CLAUSE}
+        DETACH DELETE n
+        WITH DISTINCT o
+        UNWIND $values AS v
+        CREATE (o)-[:HAS_VALUE]->(:Value:`{BASE_LABEL}` {{uri: v.uri, title: v.title, value: v.value, _version: $version}})
+        RETURN count(*) AS created
+    """
+
+    VALUES_TO_MIGRATE_QUERY = """
+        MATCH (o:Object) WHERE o.uri > $after AND (o)-[:HAS_VALUE]->(:Value)
+        WITH o ORDER BY o.uri LIMIT $limit
+        MATCH (o)-[:HAS_VALUE]->(v:Value)
+        RETURN o.uri AS uri, collect({title: v.title, value: v.value}) AS values
+        ORDER BY uri
+    """
+
+    INLINE_VALUES_QUERY = f"""
+        UNWIND $rows AS row
+        MATCH (o:Object {{uri: row.uri}})-[:HAS_VALUE]->(n:Value)
+        SET o += row.values, o._version = coalesce($version, o._version)
+        {TOMBSTONE_CLAUSE}
+        DETACH DELETE n
+        RETURN count(n) AS values
+    """
+
+    # values and relation targets come from pattern comprehensions, so each
+    # object stays a single row instead of multiplying through OPTIONAL MATCH
+    OBJECT_PROJECTION = """
+        RETURN o.uri AS uri, properties(o) AS props,
+               head([(o)-[:RDF_TYPE]->(k:Class) | k.uri]) AS class_uri,
+               [(o)-[:HAS_VALUE]->(v:Value) | {title: v.title, value: v.value}] AS values,
+               [(o)-[r]->(t) WHERE NOT type(r) IN ['RDF_TYPE', 'HAS_VALUE'] | {type: type(r), uri: t.uri}] AS relations
+    """
+
+    OBJECTS_PAGE_QUERY = """
+        MATCH (c:Class)<-[:RDF_TYPE]-(o:Object)
+        WHERE c.uri IN $class_uris AND o.uri > $after
+        WITH DISTINCT o ORDER BY o.uri LIMIT $limit
+    """ + OBJECT_PROJECTION + """
+        ORDER BY uri
+    """
+
+    OBJECTS_BY_URIS_QUERY = """
+        UNWIND $uris AS object_uri
+        MATCH (o:Object {uri: object_uri})
+    """ + OBJECT_PROJECTION
+
+    FILTER_OPERATORS = {
+        "eq": "=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "prefix": "STARTS WITH",
+    }
+
+    OBJECT_FULLTEXT_INDEX = "object_text"
+
+    VALUE_INDEX = (
+        "value_title_value",
+        "CREATE RANGE INDEX value_title_value IF NOT EXISTS FOR (n:Value) ON (n.title, n.value)",
+    )
+
+    SEARCH_OBJECTS_QUERY = """
+        CALL db.index.fulltext.queryNodes($index, $text) YIELD node AS o, score
+        WHERE o:Object AND ($class_uris IS NULL
+              OR EXISTS { (o)-[:RDF_TYPE]->(c:Class) WHERE c.uri IN $class_uris })
+        WITH o, score ORDER BY score DESC, o.uri SKIP $skip LIMIT $limit
+    """ + OBJECT_PROJECTION + """, score
+        ORDER BY score DESC, uri
+    """
+
+    def __init__(self, neo_repo, cache_size: int = None, signature_cache_size: int = 1024,
+                 inline_values: bool = False):
         self.neo_repo = neo_repo
+        # keep datatype values as Object properties instead of Value nodes
+        self.inline_values = inline_values
+        self.cache = ClassHierarchyCache(cache_size) if cache_size else None
+        self.closure = ClassClosureIndex()
+        self.effective_signatures = ClassHierarchyCache(signature_cache_size)
+        # names of indexes already created on demand by this repository
+        self._indexes = set()
+
+    @property
+    def metrics(self):
+        return self.neo_repo.metrics
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache else None
+
+    def _cache_get(self, key, default):
+        if self.cache is None:
+            return default
+        return self.cache.get(key, default)
+
+    def _cache_put(self, key, value, depends_on):
+        if self.cache is not None:
+            self.cache.put(key, value, depends_on)
+        return value
+
+    def _invalidate(self, *uris):
+        if self.cache is not None:
+            self.cache.invalidate(*uris)
+        self.effective_signatures.invalidate(*uris)
+
+    def _invalidate_key(self, *keys):
+        if self.cache is not None:
+            self.cache.invalidate_key(*keys)
+
+    def _reset_caches(self):
+        if self.cache is not None:
+            self.cache.clear()
+        self.effective_signatures.clear()
+        self.closure.reset()
+
+    def _signature_changed(self, *class_uris):
+        self._invalidate_key(*[("signature", uri) for uri in class_uris])
+        self.effective_signatures.invalidate(*class_uris)
+
+    @staticmethod
+    def _node_uris(nodes):
+        return [node["uri"] for node in nodes]
 
+    def _nodes(self, records, key):
+        return [self.neo_repo._extract_node(rec[key]) for rec in records]
+
+    @staticmethod
+    def _class_updates(title: str = None, description: str = None):
+        updates = {}
+        if title:
+            updates["title"] = title
+        if description:
+            updates["description"] = description
+        return updates
+
+    def _class_created(self, node, parent_uri: str = None):
+        if parent_uri:
+            self._invalidate_key(("children", parent_uri))
+        else:
+            self._invalidate_key(self.ROOTS_KEY)
+        if self.closure.loaded:
+            self.closure.add_class(node["uri"], parent_uri)
+
+    def _delete_subtree_queries(self):
+        chunk_size = self.neo_repo.chunk_size
+        return [
+            (kind, match + f"""
+            CALL {{ WITH n {CHUNKED_TOMBSTONE_CLAUSE} DETACH DELETE n }} IN TRANSACTIONS OF {chunk_size} ROWS
+            RETURN count(*) AS deleted
+        """)
+            for kind, match in self.DELETE_SUBTREE_STEPS
+        ]
+
+    def _classes_deleted(self, uri: str, class_uris):
+        self._invalidate(uri, *class_uris)
+        self.closure.remove_classes(class_uris)
+
+    @staticmethod
+    def _signature_from_record(record):
+        return {
+            "datatype_properties": [r for r in record["dprops"] if r["title"] is not None],
+            "object_properties": [r for r in record["oprops"] if r["title"] is not None],
+        }
+
+    @staticmethod
+    def _signature_depends_on(class_uri: str, sig):
+        return [class_uri] + [p["range_uri"] for p in sig["object_properties"]]
+
+    def _pending_lineages(self, signatures, missing):
+        closure = self.closure
+        return {
+            # the class itself first, then ancestors from the closest one up
+            uri: [uri] + sorted(closure.ancestors(uri), key=lambda a: -len(closure.ancestors(a)))
+            for uri, sig in signatures.items() if sig is missing
+        }
+
+    def _merge_effective_signatures(self, lineages, direct, signatures):
+        for uri, lineage in lineages.items():
+            if uri not in direct:
+                signatures[uri] = None
+                continue
+            sig = {"datatype_properties": [], "object_properties": []}
+            for kind in sig:
+                seen = set()
+                for owner in lineage:
+                    for prop in direct.get(owner, {}).get(kind, []):
+                        if prop["title"] not in seen:
+                            seen.add(prop["title"])
+                            sig[kind].append({**prop, "defined_in": owner})
+            ranges = [p["range_uri"] for p in sig["object_properties"]]
+            self.effective_signatures.put(uri, sig, lineage + ranges)
+            signatures[uri] = sig
+        return signatures
+
+    def _validate_attributes(self, class_uri: str, signature, fields):
+        if signature is None:
+            return
+        allowed = {p["title"] for p in signature["datatype_properties"]}
+        unknown = sorted(set(fields) - allowed - set(self.OBJECT_FIELDS))
+        if unknown:
+            raise ValueError(f"Class {class_uri} has no datatype properties {unknown}")
+
+    def _split_fields(self, values: dict):
+        # title and description live on the Object node in both storage modes
+        reserved = sorted(set(values) & set(self.RESERVED_FIELDS))
+        if reserved:
+            raise ValueError(f"Object fields {reserved} are managed by the repository")
+        fields = {k: v for k, v in values.items() if k in self.OBJECT_FIELDS}
+        attributes = {k: v for k, v in values.items() if k not in self.OBJECT_FIELDS}
+        return fields, attributes
+
+    def _validate_rows(self, class_uri: str, signature, rows):
+        for row in rows:
+            self._validate_attributes(class_uri, signature, row["props"])
+
+    def _attributes_from_record(self, record):
+        attributes = {k: v for k, v in record["props"].items() if k not in self.OBJECT_FIELDS}
+        attributes.update({v["title"]: v["value"] for v in record["values"] if v["title"] is not None})
+        return attributes
+
+    def _value_rows(self, values: dict):
+        generate_uri = self.neo_repo.generate_random_string
+        return [{"uri": generate_uri(), "title": field, "value": value} for field, value in values.items()]
+
+    def _filter_predicates(self, filters: dict):
+        predicates = []
+        for field, condition in (filters or {}).items():
+            if not isinstance(condition, dict):
+                condition = {"eq": condition}
+            for op, value in condition.items():
+                if op not in self.FILTER_OPERATORS:
+                    raise ValueError(f"Unknown filter operator {op!r} for {field!r}")
+                predicates.append((field, op, value))
+        return predicates
+
+    @staticmethod
+    def _index_name(field: str, kind: str):
+        return f"object_{re.sub(r'[^0-9a-z_]', '_', field.lower())}_{kind}"
+
+    def _on_object(self, field: str):
+        return self.inline_values or field in self.OBJECT_FIELDS
+
+    def _attribute_index_statements(self, predicates):
+        statements = {}
+        for field, op, _ in predicates:
+            if not self._on_object(field):
+                statements.setdefault(*self.VALUE_INDEX)
+                continue
+            if field == "uri":
+                # already backed by the uniqueness constraint
+                continue
+            escaped = field.replace("`", "``")
+            # ensure_schema already creates the title index under this name
+            name = "object_title" if field == "title" else self._index_name(field, "range")
+            statements[name] = (f"CREATE RANGE INDEX {name} IF NOT EXISTS "
+                                f"FOR (n:Object) ON (n.`{escaped}`)")
+            if op == "prefix":
+                name = self._index_name(field, "text")
+                statements[name] = (f"CREATE TEXT INDEX {name} IF NOT EXISTS "
+                                    f"FOR (n:Object) ON (n.`{escaped}`)")
+        return list(statements.items())
+
+    def _find_objects_query(self, predicates):
+        params = {}
+        object_conditions, value_conditions = [], {}
+        for i, (field, op, value) in enumerate(predicates):
+            params[f"p{i}"] = value
+            if self._on_object(field):
+                escaped = field.replace("`", "``")
+                object_conditions.append(f"o.`{escaped}` {self.FILTER_OPERATORS[op]} $p{i}")
+            else:
+                value_conditions.setdefault(field, []).append(f"{self.FILTER_OPERATORS[op]} $p{i}")
+        class_filter = "AND EXISTS { (o)-[:RDF_TYPE]->(c:Class) WHERE c.uri IN $class_uris }"
+        if not predicates:
+            # nothing to seek an index with, so start from the classes' own objects
+            query = "MATCH (c:Class)<-[:RDF_TYPE]-(o:Object) WHERE c.uri IN $class_uris\nWITH DISTINCT o\n"
+            class_filter = ""
+        elif not value_conditions:
+            query = "MATCH (o:Object)\n"
+            query += "WHERE " + " AND ".join(object_conditions) + "\n"
+        else:
+            # one Value match per attribute, each backed by the (title, value) index;
+            # title and description are compared on the Object node itself
+            query = ""
+            for j, (field, conditions) in enumerate(value_conditions.items()):
+                params[f"f{j}"] = field
+                where = " AND ".join(f"v{j}.value {condition}" for condition in conditions)
+                query += (f"MATCH ({'o' if j else 'o:Object'})-[:HAS_VALUE]->(v{j}:Value {{title: $f{j}}}) "
+                          f"WHERE {where}\n")
+            query += "WITH DISTINCT o\n"
+            if object_conditions:
+                query += "WHERE " + " AND ".join(object_conditions) + "\n"
+        query += f"""
+            WITH o WHERE o.uri > $after {class_filter}
+            WITH o ORDER BY o.uri LIMIT $limit
+        """ + self.OBJECT_PROJECTION + """
+            ORDER BY uri
+        """
+        return query, params
+
+    def _fulltext_index_statement(self):
+        return (self.OBJECT_FULLTEXT_INDEX,
+                f"CREATE FULLTEXT INDEX {self.OBJECT_FULLTEXT_INDEX} IF NOT EXISTS "
+                f"FOR (n:Object) ON EACH [n.title, n.description]")
+
+    @staticmethod
+    def _class_graph(records):
+        builder = CSRBuilder()
+        for rec in records:
+            builder.add_node(rec["uri"], ["Class"])
+            for parent_uri in rec["parents"]:
+                builder.add_arc("SUBCLASS_OF", rec["uri"], parent_uri)
+        return builder.build()
+
+    def _hydrate_object(self, record):
+        relations = {}
+        for rel in record["relations"]:
+            relations.setdefault(rel["type"], []).append(rel["uri"])
+        return {
+            "uri": record["uri"],
+            "class_uri": record["class_uri"],
+            "title": record["props"].get("title"),
+            "description": record["props"].get("description"),
+            "attributes": self._attributes_from_record(record),
+            "relations": relations,
+        }
+
+    def _objects_in_order(self, uris, records):
+        found = {rec["uri"]: self._hydrate_object(rec) for rec in records}
+        return [found.get(uri) for uri in uris]
+
+    @staticmethod
+    def _inline_rows(records):
+        return [
+            {"uri": rec["uri"], "values": {v["title"]: v["value"] for v in rec["values"]}}
+            for rec in records
+        ]
+
+    def _object_rows(self, objects):
+        rows = []
+        for idx, item in enumerate(objects):
+            properties, relations = item if isinstance(item, tuple) else (item, None)
+            rows.append(self._object_row(idx, properties, relations))
+        return rows
+
+    def _object_row(self, idx: int, properties: dict, relations: dict = None):
+        fields, values = self._split_fields(properties)
+        props = {
+            "uri": self.neo_repo.generate_random_string(),
+            "title": fields.get("title", ""),
+            "description": fields.get("description", ""),
+        }
+        if self.inline_values:
+            props.update(values)
+            values = {}
+        return {
+            "idx": idx,
+            "props": props,
+            # DatatypeProperty values
+            "values": self._value_rows(values),
+            # ObjectProperty values
+            "relations": dict(relations or {}),
+        }
+
+    @staticmethod
+    def _create_objects_query(class_uri: str, rows: list):
+        rel_types = sorted({field for row in rows for field in row["relations"]})
+        params = {"class_uri": class_uri, "rows": rows}
+        query = f"""
+            UNWIND $rows AS row
+            MATCH (c:Class {{uri:$class_uri}})
+            CREATE (o:Object:`{BASE_LABEL}`)
+            SET o = row.props, o._version = coalesce($version, o._version)
+            CREATE (o)-[:RDF_TYPE]->(c)
+            FOREACH (v IN row.values |
+                CREATE (o)-[:HAS_VALUE]->(:Value:`{BASE_LABEL}` {{uri: v.uri, title: v.title, value: v.value, _version: $version}}))
+        """
+        for i, rel_type in enumerate(rel_types):
+            params[f"rel_{i}"] = rel_type
+            query += f"""
+            WITH o, row
+            OPTIONAL MATCH (t:`{BASE_LABEL}` {{uri: row.relations[$rel_{i}]}})
+            WITH o, row, collect(t) AS targets
+            FOREACH (t IN targets | CREATE (o)-[:`{rel_type}`]->(t))
+        """
+        query += """
+            RETURN row.idx AS idx, o
+        """
+        return query, params
+
+
+class OntologyRepository(OntologyRepositoryBase):
+
+    neo_repo: Neo4jRepository
+
+    @instrumented
+    def ensure_schema(self):
+        self.neo_repo.ensure_schema(self.SCHEMA_LABELS)
+
+    def _cached(self, key, load, depends_on):
+        if self.cache is None:
+            return load()
+        return self.cache.get_or_load(key, load, depends_on)
+
+    @instrumented
     def create_class(self, title: str, description: str, parent_uri: str = None):
         node = self.neo_repo.create_node(
             ["Class"], {"title": title, "description": description}
         )
         if parent_uri:
             self.neo_repo.create_arc(node["uri"], parent_uri, "SUBCLASS_OF")
+        self._class_created(node, parent_uri)
         return node
 
-    def get_class(self, uri: str):
-        return self.neo_repo.get_node_by_uri(uri)
+    @instrumented
+    def get_class(self, uri: str, **read_options):
+        return self.neo_repo.get_node_by_uri(uri, **read_options)
 
+    @instrumented
     def update_class(self, uri: str, title: str = None, description: str = None):
-        updates = {}
-        if title:
-            updates["title"] = title
-        if description:
-            updates["description"] = description
-        return self.neo_repo.update_node(uri, updates)
+        node = self.neo_repo.update_node(uri, self._class_updates(title, description))
+        self._invalidate(uri)
+        return node
 
+    @instrumented
     def delete_class(self, uri: str):
-        query = """
-            MATCH (c:Class {uri:$uri})
-            OPTIONAL MATCH (c)<-[:SUBCLASS_OF*0..]-(child:Class)
-            OPTIONAL MATCH (o:Object)-[:RDF_TYPE]->(child)
-            DETACH DELETE c, child, o
-        """
-        self.neo_repo.run_custom_query(query, {"uri": uri})
+        records = self.neo_repo.run_custom_query(self.SUBTREE_CLASSES_QUERY, {"uri": uri}, write=False)
+        class_uris = records[0]["class_uris"] if records else []
+        deleted = {kind: 0 for kind, _ in self.DELETE_SUBTREE_STEPS}
+        if class_uris:
+            for kind, query in self._delete_subtree_queries():
+                records = self.neo_repo.run_auto_commit_query(
+                    query, {"uris": class_uris, "track": self.neo_repo.track_changes}
+                )
+                deleted[kind] = records[0]["deleted"] if records else 0
+        self._classes_deleted(uri, class_uris)
+        return deleted
 
+    @instrumented
     def get_ontology(self):
         return self.neo_repo.get_all_nodes_and_arcs()
 
+    def iter_ontology(self, page_size: int = None):
+        return self.neo_repo.iter_nodes_and_arcs(page_size)
+
+    def changes_since(self, version: int = 0, page_size: int = None):
+        return self.neo_repo.changes_since(version, page_size)
+
+    @instrumented
+    def export_ontology(self, path: str, page_size: int = None):
+        return export_graph(self.neo_repo, path, page_size)
+
+    @instrumented
+    def import_ontology(self, path: str, chunk_size: int = None, resume: bool = True):
+        try:
+            return import_graph(self.neo_repo, path, chunk_size, resume, self.SCHEMA_LABELS)
+        finally:
+            self._reset_caches()
+
+    @instrumented
     def get_ontology_parent_classes(self):
-        query = """
-            MATCH (c:Class)
-            WHERE NOT (c)-[:SUBCLASS_OF]->(:Class)
-            RETURN c
-        """
-        return [self.neo_repo._extract_node(rec["c"])
-                for rec in self.neo_repo.run_custom_query(query)]
+        return self._cached(
+            self.ROOTS_KEY,
+            lambda: self._nodes(self.neo_repo.run_custom_query(self.ROOT_CLASSES_QUERY, write=False), "c"),
+            self._node_uris,
+        )
 
+    @instrumented
     def get_class_parents(self, class_uri: str):
-        query = """
-            MATCH (c:Class {uri:$uri})-[:SUBCLASS_OF]->(p:Class)
-            RETURN p
-        """
-        return [self.neo_repo._extract_node(rec["p"])
-                for rec in self.neo_repo.run_custom_query(query, {"uri": class_uri})]
+        return self._cached(
+            ("parents", class_uri),
+            lambda: self._nodes(
+                self.neo_repo.run_custom_query(self.CLASS_PARENTS_QUERY, {"uri": class_uri}, write=False), "p"
+            ),
+            lambda nodes: [class_uri] + self._node_uris(nodes),
+        )
 
+    @instrumented
     def get_class_children(self, class_uri: str):
-        query = """
-            MATCH (p:Class {uri:$uri})<-[:SUBCLASS_OF]-(c:Class)
-            RETURN c
-        """
-        return [self.neo_repo._extract_node(rec["c"])
-                for rec in self.neo_repo.run_custom_query(query, {"uri": class_uri})]
+        return self._cached(
+            ("children", class_uri),
+            lambda: self._nodes(
+                self.neo_repo.run_custom_query(self.CLASS_CHILDREN_QUERY, {"uri": class_uri}, write=False), "c"
+            ),
+            lambda nodes: [class_uri] + self._node_uris(nodes),
+        )
 
+    def _class_closure(self):
+        if not self.closure.loaded:
+            records = self.neo_repo.run_custom_query(self.CLASS_CLOSURE_QUERY, write=False)
+            self.closure.load({rec["uri"]: rec["parents"] for rec in records})
+        return self.closure
+
+    @instrumented
+    def export_class_graph(self):
+        return self._class_graph(self.neo_repo.run_custom_query(self.CLASS_CLOSURE_QUERY, write=False))
+
+    @instrumented
+    def refresh_class_closure(self):
+        self.closure.reset()
+        return self._class_closure()
+
+    def _get_classes(self, uris):
+        if not uris:
+            return []
+        return self._nodes(
+            self.neo_repo.run_custom_query(self.CLASSES_BY_URIS_QUERY, {"uris": list(uris)}, write=False), "c"
+        )
+
+    @instrumented
+    def get_class_ancestors(self, class_uri: str):
+        return self._get_classes(self._class_closure().ancestors(class_uri))
+
+    @instrumented
+    def get_class_descendants(self, class_uri: str):
+        return self._get_classes(self._class_closure().descendants(class_uri))
+
+    @instrumented
+    def is_subclass_of(self, class_uri: str, parent_uri: str):
+        return self._class_closure().is_subclass_of(class_uri, parent_uri)
+
+    @instrumented
     def add_class_attribute(self, class_uri: str, title: str):
         prop_node = self.neo_repo.create_node(["DatatypeProperty"], {"title": title})
         self.neo_repo.create_arc(class_uri, prop_node["uri"], "DOMAIN")
+        self._signature_changed(class_uri)
         return prop_node
 
+    @instrumented
     def delete_class_attribute(self, class_uri: str, title: str):
-        query = """
-            MATCH (c:Class {uri:$uri})-[:DOMAIN]->(p:DatatypeProperty {title:$title})
-            DETACH DELETE p
-        """
-        self.neo_repo.run_custom_query(query, {"uri": class_uri, "title": title})
+        self.neo_repo.run_custom_query(
+            self.DELETE_CLASS_ATTRIBUTE_QUERY, {"uri": class_uri, "title": title}
+        )
+        self._signature_changed(class_uri)
 
+    @instrumented
     def add_class_object_attribute(self, class_uri: str, title: str, range_class_uri: str):
         prop_node = self.neo_repo.create_node(["ObjectProperty"], {"title": title})
         self.neo_repo.create_arc(class_uri, prop_node["uri"], "DOMAIN")
         self.neo_repo.create_arc(prop_node["uri"], range_class_uri, "RANGE")
+        self._signature_changed(class_uri)
         return prop_node
 
+    @instrumented
     def delete_class_object_attribute(self, object_property_uri: str):
-        query = """
-            MATCH (p:ObjectProperty {uri:$uri})
-            DETACH DELETE p
-        """
-        self.neo_repo.run_custom_query(query, {"uri": object_property_uri})
+        records = self.neo_repo.run_custom_query(
+            self.DELETE_CLASS_OBJECT_ATTRIBUTE_QUERY, {"uri": object_property_uri}
+        )
+        if records:
+            self._signature_changed(*records[0]["class_uris"])
 
+    @instrumented
     def collect_signature(self, class_uri: str):
-        query = """
-            MATCH (c:Class {uri:$uri})
-            OPTIONAL MATCH (c)-[:DOMAIN]->(dp:DatatypeProperty)
-            OPTIONAL MATCH (c)-[:DOMAIN]->(op:ObjectProperty)-[:RANGE]->(rc:Class)
-            WITH collect(distinct {title: dp.title, kind:'datatype'}) as dprops,
-                 collect(distinct {title: op.title, kind:'object', range_title: rc.title, range_uri: rc.uri}) as oprops
-            RETURN dprops, oprops
-        """
-        record = self.neo_repo.run_custom_query(query, {"uri": class_uri})[0]
-        return {
-            "datatype_properties": [r for r in record["dprops"] if r["title"] is not None],
-            "object_properties": [r for r in record["oprops"] if r["title"] is not None],
-        }
+        return self._cached(
+            ("signature", class_uri),
+            lambda: self._signature_from_record(
+                self.neo_repo.run_custom_query(self.SIGNATURE_QUERY, {"uri": class_uri}, write=False)[0]
+            ),
+            lambda sig: self._signature_depends_on(class_uri, sig),
+        )
 
-    def create_object(self, class_uri: str, properties: dict, relations: dict = None):
-        obj = self.neo_repo.create_node(
-            ["Object"],
-            {"title": properties.get("title", ""), "description": properties.get("description", "")}
+    @instrumented
+    def collect_effective_signatures(self, class_uris: list):
+        missing = object()
+        signatures = {uri: self.effective_signatures.get(uri, missing)
+                      for uri in dict.fromkeys(class_uris)}
+        if missing not in signatures.values():
+            return signatures
+
+        self._class_closure()
+        lineages = self._pending_lineages(signatures, missing)
+        direct = self._load_direct_signatures({a for lineage in lineages.values() for a in lineage})
+        return self._merge_effective_signatures(lineages, direct, signatures)
+
+    def _load_direct_signatures(self, class_uris):
+        records = self.neo_repo.run_custom_query(
+            self.DIRECT_SIGNATURES_QUERY, {"uris": list(class_uris)}, write=False
         )
-        self.neo_repo.create_arc(obj["uri"], class_uri, "RDF_TYPE")
+        return {rec["uri"]: self._signature_from_record(rec) for rec in records}
 
-        # DatatypeProperty values
-        for field, value in properties.items():
-            if field not in ["title", "description"]:
-                prop_node = self.neo_repo.create_node(["Value"], {"title": field, "value": value})
-                self.neo_repo.create_arc(obj["uri"], prop_node["uri"], "HAS_VALUE")
+    @instrumented
+    def create_object(self, class_uri: str, properties: dict, relations: dict = None):
+        return self.create_objects(class_uri, [(properties, relations)])[0]
 
-        # ObjectProperty values
-        if relations:
-            for field, target_uri in relations.items():
-                self.neo_repo.create_arc(obj["uri"], target_uri, field)
+    @instrumented
+    def create_objects(self, class_uri: str, objects: list, chunk_size: int = None):
+        return self._create_objects(self.neo_repo._write, class_uri, objects,
+                                    chunk_size or self.neo_repo.chunk_size)
 
-        return obj
+    def _create_objects(self, write, class_uri: str, objects: list, chunk_size: int):
+        # write runs one transaction function: Neo4jRepository._write or a session's execute_write
+        rows = self._object_rows(objects)
+        if self.inline_values:
+            self._validate_rows(class_uri, self.collect_effective_signatures([class_uri])[class_uri], rows)
+        created = [None] * len(rows)
+        for chunk in self.neo_repo._chunks(rows, chunk_size):
+            for idx, node in write(self._create_objects_chunk, class_uri, chunk):
+                created[idx] = node
+        return created
 
-    def get_object(self, object_uri: str):
-        return self.neo_repo.get_node_by_uri(object_uri)
+    def _create_objects_chunk(self, tx, class_uri: str, rows: list):
+        query, params = self._create_objects_query(class_uri, rows)
+        records = self.neo_repo._records(tx, query, params)
+        return [(rec["idx"], self.neo_repo._extract_node(rec["o"])) for rec in records]
 
+    @instrumented
+    def get_object(self, object_uri: str, **read_options):
+        return self.neo_repo.get_node_by_uri(object_uri, **read_options)
+
+    @instrumented
     def update_object(self, object_uri: str, updates: dict):
         return self.neo_repo.update_node(object_uri, updates)
 
+    @instrumented
     def delete_object(self, object_uri: str):
         return self.neo_repo.delete_node_by_uri(object_uri)
+
+    @instrumented
+    def get_objects(self, uris: list):
+        uris = list(uris)
+        if not uris:
+            return []
+        records = self.neo_repo.run_custom_query(self.OBJECTS_BY_URIS_QUERY, {"uris": uris}, write=False)
+        return self._objects_in_order(uris, records)
+
+    @instrumented
+    def list_objects(self, class_uri: str, include_subclasses: bool = False, page_size: int = None):
+        page_size = page_size or self.neo_repo.page_size
+        class_uris = [class_uri]
+        if include_subclasses:
+            class_uris += sorted(self._class_closure().descendants(class_uri))
+        after = ""
+        while True:
+            records = self.neo_repo.run_custom_query(
+                self.OBJECTS_PAGE_QUERY,
+                {"class_uris": class_uris, "after": after, "limit": page_size},
+                write=False,
+            )
+            for rec in records:
+                yield self._hydrate_object(rec)
+            if len(records) < page_size:
+                return
+            after = records[-1]["uri"]
+
+    def _ensure_indexes(self, statements):
+        for name, statement in statements:
+            if name not in self._indexes:
+                self.neo_repo.run_auto_commit_query(statement)
+                self.neo_repo.run_auto_commit_query("CALL db.awaitIndex($name)", {"name": name})
+                self._indexes.add(name)
+
+    def _prepare_find(self, class_uri: str, filters: dict, include_subclasses: bool):
+        predicates = self._filter_predicates(filters)
+        signature = self.collect_effective_signatures([class_uri])[class_uri]
+        self._validate_attributes(class_uri, signature, [field for field, _, _ in predicates])
+        self._ensure_indexes(self._attribute_index_statements(predicates))
+        class_uris = [class_uri]
+        if include_subclasses:
+            class_uris += sorted(self._class_closure().descendants(class_uri))
+        query, params = self._find_objects_query(predicates)
+        params["class_uris"] = class_uris
+        return query, params
+
+    @instrumented
+    def find_objects(self, class_uri: str, filters: dict = None, limit: int = None,
+                     after: str = "", include_subclasses: bool = False):
+        query, params = self._prepare_find(class_uri, filters, include_subclasses)
+        params.update({"after": after or "", "limit": limit or self.neo_repo.page_size})
+        records = self.neo_repo.run_custom_query(query, params, write=False)
+        return [self._hydrate_object(rec) for rec in records]
+
+    @instrumented
+    def explain_find_objects(self, class_uri: str, filters: dict = None, include_subclasses: bool = False):
+        query, params = self._prepare_find(class_uri, filters, include_subclasses)
+        params.update({"after": "", "limit": self.neo_repo.page_size})
+        return plan_operators(self.neo_repo.explain(query, params))
+
+    @instrumented
+    def search_objects(self, text: str, class_uri: str = None, limit: int = None, skip: int = 0,
+                       include_subclasses: bool = False):
+        self._ensure_indexes([self._fulltext_index_statement()])
+        class_uris = None
+        if class_uri:
+            class_uris = [class_uri]
+            if include_subclasses:
+                class_uris += sorted(self._class_closure().descendants(class_uri))
+        records = self.neo_repo.run_custom_query(self.SEARCH_OBJECTS_QUERY, {
+            "index": self.OBJECT_FULLTEXT_INDEX, "text": text, "class_uris": class_uris,
+            "skip": skip, "limit": limit or self.neo_repo.page_size,
+        }, write=False)
+        return [{**self._hydrate_object(rec), "score": rec["score"]} for rec in records]
+
+    @instrumented
+    def get_object_attributes(self, object_uri: str):
+        query = self.INLINE_ATTRIBUTES_QUERY if self.inline_values else self.OBJECT_ATTRIBUTES_QUERY
+        records = self.neo_repo.run_custom_query(query, {"uri": object_uri}, write=False)
+        if not records:
+            return None
+        return self._attributes_from_record(records[0])
+
+    @instrumented
+    def update_object_attributes(self, object_uri: str, values: dict):
+        records = self.neo_repo.run_custom_query(self.OBJECT_CLASS_QUERY, {"uri": object_uri}, write=False)
+        if not records:
+            return None
+        fields, attributes = self._split_fields(values)
+        class_uri = records[0]["class_uri"]
+        self._validate_attributes(class_uri, self.collect_effective_signatures([class_uri])[class_uri], attributes)
+        if self.inline_values:
+            records = self.neo_repo.run_custom_query(
+                self.SET_INLINE_ATTRIBUTES_QUERY, {"uri": object_uri, "values": {**fields, **attributes}}
+            )
+            return self._attributes_from_record(records[0]) if records else None
+        self.neo_repo.run_custom_query(self.REPLACE_VALUE_NODES_QUERY, {
+            "uri": object_uri, "fields": fields, "titles": list(attributes),
+            "values": self._value_rows(attributes),
+        })
+        return self.get_object_attributes(object_uri)
+
+    @instrumented
+    def migrate_values_inline(self, batch_size: int = None):
+        batch_size = batch_size or self.neo_repo.chunk_size
+        migrated = {"objects": 0, "values": 0}
+        after = ""
+        while True:
+            objects, values, after = self.neo_repo._write(self._migrate_values_batch, batch_size, after)
+            if not objects:
+                return migrated
+            migrated["objects"] += objects
+            migrated["values"] += values
+
+    def _migrate_values_batch(self, tx, limit: int, after: str):
+        # keyset on uri, so each batch seeks past the objects already migrated
+        records = self.neo_repo._records(tx, self.VALUES_TO_MIGRATE_QUERY, {"after": after, "limit": limit})
+        if not records:
+            return 0, 0, after
+        rows = self._inline_rows(records)
+        result = self.neo_repo._records(tx, self.INLINE_VALUES_QUERY, {"rows": rows})
+        return len(rows), result[0]["values"], rows[-1]["uri"]
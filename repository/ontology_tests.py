@@ -1,6 +1,12 @@
+import asyncio
+import os
+import tempfile
 import unittest
 from neo4j_driver.neo4j_repo import Neo4jRepository
+from neo4j_driver.async_neo4j_repo import AsyncNeo4jRepository
 from ontology_repo import OntologyRepository
+from async_ontology_repo import AsyncOntologyRepository
+from parallel_loader import ParallelObjectLoader
 
 uri = "bolt://localhost:7687"
 user = "neo4j"
@@ -14,6 +20,7 @@ class TestOntologyRepository(unittest.TestCase):
         cls.neo = Neo4jRepository(uri, user, password)
         cls.repo = OntologyRepository(cls.neo)
         cls.neo.run_custom_query("MATCH (n) DETACH DELETE n")
+        cls.repo.ensure_schema()
 
     @classmethod
     def tearDownClass(cls):
@@ -124,6 +131,320 @@ class TestOntologyRepository(unittest.TestCase):
         got = self.repo.get_object(alex["uri"])
         self.assertEqual(got["properties"]["title"], "Alex")
 
+    def test_create_objects_bulk(self):
+        # Класс и его атрибуты
+        city_cls = self.repo.create_class("Town", "Settlement")
+        self.repo.add_class_attribute(city_cls["uri"], "population")
+
+        # Пакетное создание объектов одного класса
+        towns = self.repo.create_objects(
+            city_cls["uri"],
+            [{"title": f"Town {i}", "population": i * 1000} for i in range(5)],
+            chunk_size=2,
+        )
+        self.assertEqual(len(towns), 5)
+        self.assertEqual(towns[4]["properties"]["title"], "Town 4")
+
+        # Каждый объект связан с классом и своим значением
+        got = self.repo.get_object(towns[0]["uri"])
+        arc_types = sorted(arc["uri"] for arc in got["arcs"])
+        self.assertEqual(arc_types, ["HAS_VALUE", "RDF_TYPE"])
+
+        # Объект несуществующего класса не создается
+        self.assertIsNone(self.repo.create_object("missing-class", {"title": "Nowhere"}))
+
+    def test_class_cache_invalidation(self):
+        # Отдельный репозиторий с кэшем иерархии классов
+        cached = OntologyRepository(self.neo, cache_size=16)
+        animal = cached.create_class("Animal", "Living being")
+        dog = cached.create_class("Dog", "Barks", parent_uri=animal["uri"])
+
+        # Повторное чтение берется из кэша
+        cached.get_class_children(animal["uri"])
+        cached.get_class_children(animal["uri"])
+        self.assertEqual(cached.cache_stats()["hits"], 1)
+
+        # Переименование класса сбрасывает зависящие от него записи
+        cached.update_class(dog["uri"], title="Hound")
+        children = cached.get_class_children(animal["uri"])
+        self.assertEqual(children[0]["properties"]["title"], "Hound")
+
+        # Новый атрибут виден в сигнатуре
+        cached.collect_signature(dog["uri"])
+        cached.add_class_attribute(dog["uri"], "breed")
+        sig = cached.collect_signature(dog["uri"])
+        self.assertTrue(any(f["title"] == "breed" for f in sig["datatype_properties"]))
+
+        # Удаление класса сбрасывает список потомков родителя
+        cached.delete_class(dog["uri"])
+        self.assertEqual(cached.get_class_children(animal["uri"]), [])
+
+    def test_transitive_hierarchy(self):
+        # Цепочка Vehicle <- Car <- SportsCar
+        vehicle = self.repo.create_class("Vehicle", "Moves")
+        car = self.repo.create_class("Passenger car", "Four wheels", parent_uri=vehicle["uri"])
+        self.assertTrue(self.repo.is_subclass_of(car["uri"], vehicle["uri"]))
+
+        # Индекс замыкания обновляется при создании класса
+        sports = self.repo.create_class("SportsCar", "Fast", parent_uri=car["uri"])
+        self.assertTrue(self.repo.is_subclass_of(sports["uri"], vehicle["uri"]))
+        self.assertFalse(self.repo.is_subclass_of(vehicle["uri"], sports["uri"]))
+
+        ancestors = {c["properties"]["title"] for c in self.repo.get_class_ancestors(sports["uri"])}
+        self.assertEqual(ancestors, {"Vehicle", "Passenger car"})
+        descendants = {c["uri"] for c in self.repo.get_class_descendants(vehicle["uri"])}
+        self.assertEqual(descendants, {car["uri"], sports["uri"]})
+
+        # ...и при удалении поддерева
+        self.repo.delete_class(car["uri"])
+        self.assertEqual(self.repo.get_class_descendants(vehicle["uri"]), [])
+        self.assertFalse(self.repo.is_subclass_of(sports["uri"], vehicle["uri"]))
+
+    def test_effective_signatures(self):
+        # Наследование атрибутов по SUBCLASS_OF
+        doc = self.repo.create_class("Document", "Any document")
+        self.repo.add_class_attribute(doc["uri"], "created")
+        report = self.repo.create_class("Report", "Report", parent_uri=doc["uri"])
+        self.repo.add_class_attribute(report["uri"], "pages")
+
+        sigs = self.repo.collect_effective_signatures([report["uri"], doc["uri"]])
+        report_fields = {f["title"]: f["defined_in"] for f in sigs[report["uri"]]["datatype_properties"]}
+        self.assertEqual(report_fields, {"pages": report["uri"], "created": doc["uri"]})
+        self.assertEqual(len(sigs[doc["uri"]]["datatype_properties"]), 1)
+
+        # Атрибут предка сбрасывает сигнатуры потомков
+        self.repo.add_class_attribute(doc["uri"], "author")
+        sig = self.repo.collect_effective_signatures([report["uri"]])[report["uri"]]
+        self.assertTrue(any(f["title"] == "author" for f in sig["datatype_properties"]))
+
+    def test_export_import_roundtrip(self):
+        # Экспорт в NDJSON, очистка базы и повторный импорт
+        animal = self.repo.create_class("Animal", "Animal")
+        cat = self.repo.create_class("Cat", "Cat", parent_uri=animal["uri"])
+        self.repo.add_class_attribute(cat["uri"], "color")
+        tom = self.repo.create_object(cat["uri"], {"title": "Tom", "color": "grey"})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ontology.ndjson")
+            exported = self.repo.export_ontology(path, page_size=2)
+            self.neo.run_custom_query("MATCH (n) DETACH DELETE n")
+            imported = self.repo.import_ontology(path, chunk_size=3)
+            self.assertEqual(imported, exported)
+            self.assertFalse(os.path.exists(path + ".checkpoint"))
+            # импорт сам создаёт ограничения уникальности uri
+            names = {rec["name"] for rec in self.neo.run_auto_commit_query("SHOW CONSTRAINTS YIELD name")}
+            self.assertTrue({"resource_uri_unique", "object_uri_unique", "class_uri_unique"} <= names)
+            # повторный импорт ничего не дублирует
+            self.repo.import_ontology(path)
+
+        got = self.repo.get_object(tom["uri"])
+        self.assertEqual(got["properties"]["title"], "Tom")
+        self.assertEqual(sorted(arc["uri"] for arc in got["arcs"]), ["HAS_VALUE", "RDF_TYPE"])
+        self.assertTrue(self.repo.is_subclass_of(cat["uri"], animal["uri"]))
+
+    def test_delete_class_subtree_counts(self):
+        # Каскадное удаление поддерева вместе со значениями объектов
+        plant = self.repo.create_class("Plant", "Plant")
+        tree = self.repo.create_class("Tree", "Tree", parent_uri=plant["uri"])
+        self.repo.add_class_attribute(tree["uri"], "height")
+        self.repo.create_objects(tree["uri"], [{"title": f"Oak {i}", "height": i} for i in range(5)])
+        oak = self.repo.create_class("Oak", "Oak", parent_uri=tree["uri"])
+
+        # классы удаляются от самых глубоких к корню, корень — последним
+        records = self.neo.run_custom_query(self.repo.SUBTREE_CLASSES_QUERY, {"uri": plant["uri"]}, write=False)
+        self.assertEqual(records[0]["class_uris"], [oak["uri"], tree["uri"], plant["uri"]])
+
+        self.neo.track_changes = True
+        try:
+            start = self.neo.current_version()
+            deleted = self.repo.delete_class(plant["uri"])
+            # каждая порция удаления получает версию внутри своей транзакции
+            tombstones = [c for c in self.repo.changes_since(start) if c["deleted"]]
+        finally:
+            self.neo.track_changes = False
+        self.assertEqual(deleted, {"values": 5, "objects": 5, "properties": 1, "classes": 3})
+        self.assertTrue({oak["uri"], tree["uri"], plant["uri"]} <= {c["uri"] for c in tombstones})
+        self.assertTrue(all(c["version"] > start for c in tombstones))
+        records = self.neo.run_custom_query(
+            "MATCH (v:Value {title: 'height'}) RETURN count(v) AS n", write=False
+        )
+        self.assertEqual(records[0]["n"], 0)
+        self.assertIsNone(self.repo.get_class(tree["uri"]))
+
+    def test_inline_values_and_migration(self):
+        # Объект со значениями в узле Value мигрируется в свойства узла Object
+        book = self.repo.create_class("Book", "Book")
+        self.repo.add_class_attribute(book["uri"], "pages")
+        old = self.repo.create_object(book["uri"], {"title": "Old", "pages": 100})
+        self.assertEqual(self.repo.get_object_attributes(old["uri"]), {"pages": 100})
+        # title хранится в самом объекте, а uri задать нельзя
+        self.repo.update_object_attributes(old["uri"], {"title": "Older"})
+        self.assertEqual(self.repo.get_object(old["uri"])["properties"]["title"], "Older")
+        self.assertEqual(self.repo.get_object_attributes(old["uri"]), {"pages": 100})
+        with self.assertRaises(ValueError):
+            self.repo.create_object(book["uri"], {"title": "Bad", "uri": "fixed"})
+
+        inline = OntologyRepository(self.neo, inline_values=True)
+        new = inline.create_object(book["uri"], {"title": "New", "pages": 200})
+        self.assertEqual(new["properties"]["pages"], 200)
+        with self.assertRaises(ValueError):
+            inline.create_object(book["uri"], {"title": "Bad", "isbn": "123"})
+
+        # до миграции значения из узлов Value видны и в инлайн-режиме,
+        # а инлайн-запись удаляет одноимённые узлы Value
+        mixed = self.repo.create_object(book["uri"], {"title": "Mixed", "pages": 10})
+        self.assertEqual(inline.get_object_attributes(mixed["uri"]), {"pages": 10})
+        self.assertEqual(inline.update_object_attributes(mixed["uri"], {"pages": 11}), {"pages": 11})
+
+        migrated = inline.migrate_values_inline(batch_size=1)
+        self.assertGreaterEqual(migrated["objects"], 1)
+        self.assertEqual(inline.get_object_attributes(old["uri"]), {"pages": 100})
+        # миграция не возвращает старое значение поверх нового
+        self.assertEqual(inline.get_object_attributes(mixed["uri"]), {"pages": 11})
+        self.assertEqual(inline.update_object_attributes(old["uri"], {"pages": 120}), {"pages": 120})
+        with self.assertRaises(ValueError):
+            inline.update_object_attributes(old["uri"], {"_version": 0})
+        arcs = [arc["uri"] for arc in inline.get_object(old["uri"])["arcs"]]
+        self.assertNotIn("HAS_VALUE", arcs)
+
+    def test_list_objects_hydrated(self):
+        # Постраничный список объектов класса со значениями и связями
+        city = self.repo.create_class("City", "City")
+        capital = self.repo.create_class("Capital", "Capital", parent_uri=city["uri"])
+        country = self.repo.create_class("Country", "Country")
+        self.repo.add_class_attribute(city["uri"], "population")
+        self.repo.add_class_object_attribute(city["uri"], "located_in", country["uri"])
+        france = self.repo.create_object(country["uri"], {"title": "France"})
+        lyon = self.repo.create_object(city["uri"], {"title": "Lyon", "population": 500},
+                                       {"located_in": france["uri"]})
+        paris = self.repo.create_object(capital["uri"], {"title": "Paris", "population": 2100})
+
+        only_cities = list(self.repo.list_objects(city["uri"], page_size=1))
+        self.assertEqual([o["uri"] for o in only_cities], [lyon["uri"]])
+        self.assertEqual(only_cities[0]["attributes"], {"population": 500})
+        self.assertEqual(only_cities[0]["relations"], {"located_in": [france["uri"]]})
+
+        all_cities = list(self.repo.list_objects(city["uri"], include_subclasses=True, page_size=1))
+        self.assertEqual({o["title"] for o in all_cities}, {"Lyon", "Paris"})
+
+        found = self.repo.get_objects([paris["uri"], "missing", lyon["uri"]])
+        self.assertEqual(found[0]["class_uri"], capital["uri"])
+        self.assertIsNone(found[1])
+        self.assertEqual(found[2]["title"], "Lyon")
+
+    def test_find_and_search_objects(self):
+        # Фильтрация по значениям атрибутов и полнотекстовый поиск
+        planet = self.repo.create_class("Planet", "Planet")
+        self.repo.add_class_attribute(planet["uri"], "radius")
+        self.repo.add_class_attribute(planet["uri"], "code")
+        inline = OntologyRepository(self.neo, inline_values=True)
+        for i, name in enumerate(["Mercury", "Venus", "Earth", "Mars"]):
+            inline.create_object(planet["uri"], {"title": name, "description": "rocky planet",
+                                                 "radius": 1000 * (i + 1), "code": f"P{i}-{name}"})
+        self.repo.create_object(planet["uri"], {"title": "Pluto", "radius": 1200, "code": "D0"})
+
+        found = inline.find_objects(planet["uri"], {"radius": {"gte": 2000, "lt": 4000}})
+        self.assertEqual({o["title"] for o in found}, {"Venus", "Earth"})
+        first = inline.find_objects(planet["uri"], {"code": {"prefix": "P"}}, limit=2)
+        rest = inline.find_objects(planet["uri"], {"code": {"prefix": "P"}}, after=first[-1]["uri"])
+        self.assertEqual(len(first) + len(rest), 4)
+        self.assertTrue(any("Index" in op for op in inline.explain_find_objects(planet["uri"], {"radius": 3000})))
+        # без фильтров поиск начинается с узла класса, а не со всех объектов
+        unfiltered = inline.explain_find_objects(planet["uri"])
+        self.assertFalse(any(op.startswith(("AllNodesScan", "NodeByLabelScan")) for op in unfiltered))
+        self.assertEqual(len(inline.find_objects(planet["uri"])), 5)
+        with self.assertRaises(ValueError):
+            inline.find_objects(planet["uri"], {"mass": 1})
+
+        # режим узлов Value
+        nodes = self.repo.find_objects(planet["uri"], {"radius": 1200})
+        self.assertEqual([o["title"] for o in nodes], ["Pluto"])
+        # поля самого объекта фильтруются по узлу Object в обоих режимах
+        self.assertEqual([o["title"] for o in self.repo.find_objects(planet["uri"], {"title": "Mars"})], ["Mars"])
+        both = self.repo.find_objects(planet["uri"], {"title": {"prefix": "P"}, "radius": 1200})
+        self.assertEqual([o["title"] for o in both], ["Pluto"])
+
+        hits = inline.search_objects("Earth", class_uri=planet["uri"])
+        self.assertEqual(hits[0]["title"], "Earth")
+        self.assertIn("score", hits[0])
+
+    def test_class_graph_csr(self):
+        # Выгрузка иерархии классов в CSR-массивы и анализ в памяти
+        root = self.repo.create_class("Organism", "Organism")
+        animal = self.repo.create_class("Animal Kingdom", "Animal", parent_uri=root["uri"])
+        bird = self.repo.create_class("Bird", "Bird", parent_uri=animal["uri"])
+        self.repo.create_class("Fungus", "Fungus", parent_uri=root["uri"])
+
+        graph = self.repo.export_class_graph()
+        depth = graph.depths()
+        self.assertEqual(depth[graph.index[root["uri"]]], 0)
+        self.assertEqual(depth[graph.index[bird["uri"]]], 2)
+        self.assertEqual(graph.subtree_sizes()[graph.index[root["uri"]]], 4)
+        descendants = graph.reachable(root["uri"], ["SUBCLASS_OF"], reverse=True)
+        self.assertEqual(len(descendants), 3)
+        self.assertEqual(len(graph.nodes_with_label("Class")), len(graph))
+
+    def test_parallel_loader(self):
+        # Параллельная загрузка объектов по нескольким классам
+        classes = [self.repo.create_class(f"Bulk {i}", "bulk")["uri"] for i in range(3)]
+        with ParallelObjectLoader(self.repo, workers=3, batch_size=4) as loader:
+            for class_uri in classes:
+                loader.submit_many(class_uri, [{"title": f"Item {j}", "n": j} for j in range(10)])
+        stats = loader.stats()
+        self.assertEqual(stats["objects"], 30)
+        self.assertEqual(stats["errors"], 0)
+
+        records = self.neo.run_custom_query(
+            "MATCH (o:Object)-[:RDF_TYPE]->(c:Class) WHERE c.uri IN $uris RETURN count(o) AS n",
+            {"uris": classes}, write=False,
+        )
+        self.assertEqual(records[0]["n"], 30)
+
+        # при исключении внутри блока недописанные буферы отбрасываются
+        lonely = self.repo.create_class("Lonely", "Lonely")
+        with self.assertRaises(RuntimeError):
+            with ParallelObjectLoader(self.repo, workers=2, batch_size=100) as loader:
+                loader.submit_many(lonely["uri"], [{"title": "Draft"}])
+                raise RuntimeError("abort")
+        self.assertEqual(loader.stats()["objects"], 0)
+        records = self.neo.run_custom_query(
+            "MATCH (o:Object)-[:RDF_TYPE]->(:Class {uri: $uri}) RETURN count(o) AS n",
+            {"uri": lonely["uri"]}, write=False,
+        )
+        self.assertEqual(records[0]["n"], 0)
+
+
+class TestAsyncOntologyRepository(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.neo = AsyncNeo4jRepository(uri, user, password)
+        self.repo = AsyncOntologyRepository(self.neo)
+
+    async def asyncTearDown(self):
+        await self.neo.close()
+
+    async def test_async_hierarchy_and_objects(self):
+        # Иерархия классов через асинхронный репозиторий
+        shape = await self.repo.create_class("Shape", "Figure")
+        circle = await self.repo.create_class("Circle", "Round", parent_uri=shape["uri"])
+        await self.repo.add_class_attribute(shape["uri"], "area")
+
+        parents, children = await asyncio.gather(
+            self.repo.get_class_parents(circle["uri"]),
+            self.repo.get_class_children(shape["uri"]),
+        )
+        self.assertEqual(parents[0]["uri"], shape["uri"])
+        self.assertEqual(children[0]["uri"], circle["uri"])
+        self.assertTrue(await self.repo.is_subclass_of(circle["uri"], shape["uri"]))
+
+        # Объект с унаследованным атрибутом
+        obj = await self.repo.create_object(circle["uri"], {"title": "Unit circle", "area": 3.14})
+        got = await self.repo.get_object(obj["uri"])
+        self.assertEqual(got["properties"]["title"], "Unit circle")
+
+        await self.repo.delete_class(shape["uri"])
+        self.assertIsNone(await self.repo.get_class(circle["uri"]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+import zlib
+
+from neo4j_driver.instrumentation import current_operation
+from ontology_repo import OntologyRepository
+
+
+class ParallelObjectLoader:
+
+    DEFAULT_WORKERS = 4
+    DEFAULT_QUEUE_SIZE = 8
+
+    _STOP = object()
+
+    def __init__(self, repo: OntologyRepository, workers: int = DEFAULT_WORKERS,
+                 batch_size: int = None, queue_size: int = DEFAULT_QUEUE_SIZE, on_batch=None):
+        self.repo = repo
+        self.batch_size = batch_size or repo.neo_repo.chunk_size
+        self.on_batch = on_batch
+        # bounded queues make submit() block once a worker falls behind
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._errors = []
+        self._discarded = False
+        self._counts = [{"objects": 0, "batches": 0, "busy_s": 0.0} for _ in range(workers)]
+        self._started = time.perf_counter()
+        self._finished = None
+        self._threads = [
+            threading.Thread(target=self._run, args=(i,), name=f"object-loader-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _partition(self, class_uri: str):
+        # every object of a class goes through one worker, so concurrent
+        # transactions never contend for the same Class node
+        return zlib.crc32(class_uri.encode()) % len(self._queues)
+
+    def _check(self):
+        if self._errors:
+            raise self._errors[0]
+
+    def submit(self, class_uri: str, properties: dict, relations: dict = None):
+        self._check()
+        with self._lock:
+            buffer = self._buffers.setdefault(class_uri, [])
+            buffer.append((properties, relations))
+            if len(buffer) < self.batch_size:
+                return
+            batch = self._buffers.pop(class_uri)
+        self._queues[self._partition(class_uri)].put((class_uri, batch))
+
+    def submit_many(self, class_uri: str, objects):
+        for item in objects:
+            properties, relations = item if isinstance(item, tuple) else (item, None)
+            self.submit(class_uri, properties, relations)
+
+    def flush(self):
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+        for class_uri, batch in buffers.items():
+            self._queues[self._partition(class_uri)].put((class_uri, batch))
+
+    def discard(self):
+        # like UnitOfWork on error: pending objects are dropped, batches
+        # already queued are skipped and only the one in flight completes
+        with self._lock:
+            self._buffers = {}
+            self._discarded = True
+        self._stop()
+
+    def close(self, raise_errors: bool = True):
+        if self._finished is None:
+            self.flush()
+        self._stop()
+        if raise_errors:
+            self._check()
+
+    def _stop(self):
+        if self._finished is None:
+            for q in self._queues:
+                q.put(self._STOP)
+            for thread in self._threads:
+                thread.join()
+            self._finished = time.perf_counter()
+
+    def _run(self, index: int):
+        current_operation.set("create_objects")
+        counts = self._counts[index]
+        session = None
+        while True:
+            item = self._queues[index].get()
+            if item is self._STOP:
+                break
+            if self._errors or self._discarded:
+                # keep draining so producers blocked on put() are released
+                continue
+            class_uri, batch = item
+            start = time.perf_counter()
+            try:
+                if session is None:
+                    # opened here, so a failed connect is reported like any other error
+                    session = self.repo.neo_repo._session()
+                created = self.repo._create_objects(session.execute_write, class_uri, batch, self.batch_size)
+                if self.on_batch is not None:
+                    self.on_batch(class_uri, created)
+            except Exception as error:
+                self._errors.append(error)
+                continue
+            with self._lock:
+                counts["objects"] += len(batch)
+                counts["batches"] += 1
+                counts["busy_s"] += time.perf_counter() - start
+        if session is not None:
+            session.close()
+
+    def stats(self):
+        with self._lock:
+            workers = [dict(c) for c in self._counts]
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        objects = sum(c["objects"] for c in workers)
+        return {
+            "objects": objects,
+            "batches": sum(c["batches"] for c in workers),
+            "errors": len(self._errors),
+            "elapsed_s": round(elapsed, 6),
+            "objects_per_s": round(objects / elapsed, 2) if elapsed else None,
+            "workers": workers,
+        }